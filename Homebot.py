@@ -2,229 +2,215 @@ import asyncio
 import logging
 import sys
 
-from aiogram import Dispatcher, F, Router
-from aiogram.filters import Command, CommandStart
+from typing import Any, Dict, List, Optional, Tuple
+from aiogram import Dispatcher, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.utils.markdown import hbold
-from aiogram.utils.keyboard import (
-    ReplyKeyboardBuilder,
-    InlineKeyboardBuilder,
-    InlineKeyboardButton,
-)
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.types import (
-    KeyboardButton,
+    BufferedInputFile,
     Message,
-    ReplyKeyboardRemove,
-    CallbackQuery
+    CallbackQuery,
+    InlineKeyboardMarkup,
 )
 from settings import bot2
+from storage import create_storage
+from dispatch_index import DispatchIndex
+from common import register_common_handlers
+from relay import relay_map
+import config
+import keyboards
+import idempotency
+import metrics
+import scheduler
+import throttling
+from questionnaire import Question, Questionnaire
+from throttling import Limit
+from pricing import Pricing, pricing_file
+from batch_quote import quote_file
+from message_edits import debounced_edits, message_locks
+import webhook
 
 order_router = Router()
+order_index = DispatchIndex()
+order_index.attach(order_router)
+
+CALCULATE_CALLBACK = 'calculate'
 
 
 class Calculate(StatesGroup):
     house_area = State()
     rooms_number = State()
     user_choices = State()
-    services = []
 
 
-@order_router.message(CommandStart())
-async def command_start_handler(message: Message) -> None:
-    await message.answer(
-        f"Привет {hbold(message.from_user.full_name)}!\nЯ Чат-бот!\n"
-        "Для расчета стоимости приемки квартиры воспользуйтесь кнопкой меню.",
-        reply_markup=ReplyKeyboardRemove(),
-    )
+class Quote(StatesGroup):
+    price_list = State()
 
 
-@order_router.message(Command("cancel"))
-@order_router.message(F.text.casefold() == "cancel")
-async def cancel_handler(message: Message, state: FSMContext) -> None:
-    current_state = await state.get_state()
-    if current_state is None:
-        return
-    logging.info("Cancelling state %r", current_state)
-    await state.clear()
-    await message.answer(
-        "Отменено",
-        reply_markup=ReplyKeyboardRemove(),
-    )
+register_common_handlers(
+    order_index,
+    "Чтобы произвести расчет стоимости приемки квартиры воспользуйтесь кнопкой меню.",
+    greeting="Для расчета стоимости приемки квартиры воспользуйтесь кнопкой меню.",
+    relay=relay_map,
+)
 
 
-@order_router.message(Command("calculate"))
+@order_index.command("calculate")
 async def calculate(message: Message, state: FSMContext) -> None:
-    await state.set_state(Calculate.house_area)
-    await message.answer(
-        'Для отмены набейте "cancel".\nПлощадь квартиры?',
-        reply_markup=ReplyKeyboardRemove(),
-    )
+    await calculate_questionnaire.start(message, state, prefix='Для отмены набейте "cancel".\n')
+
+
+async def show_services_picker(message: Message, state: FSMContext, data: Dict[str, Any]) -> None:
+    data = await state.update_data(services=[])
+    await state.set_state(Calculate.user_choices)
+    text, keyboard = services_picker(data)
+    picker = await message.answer(text, reply_markup=keyboard)
+    debounced_edits.shown(picker.chat.id, picker.message_id, text, keyboard)
+
+
+calculate_questionnaire = Questionnaire(
+    [
+        Question(
+            Calculate.house_area,
+            'Площадь квартиры?',
+            validator=str.isdigit,
+            error="Введите числовое значение",
+        ),
+        Question(Calculate.rooms_number, 'Кол-во комнат?', keyboards.ROOMS_NUMBER),
+    ],
+    on_complete=show_services_picker,
+)
+calculate_questionnaire.register(order_index)
 
 
-@order_router.message(Calculate.house_area)
-async def get_house_area(message: Message, state: FSMContext) -> None:
-    if message.text.isdigit():
-        await state.update_data(house_area=message.text)
-        await state.set_state(Calculate.rooms_number)
-        builder = ReplyKeyboardBuilder()
-        builder.row(
-            KeyboardButton(text="1"),
-            KeyboardButton(text="2"),
-        )
-        builder.row(
-            KeyboardButton(text="3"),
-            KeyboardButton(text="4"),
-        )
-        builder.row(
-            KeyboardButton(text="Студия")
-        )
-        await message.answer(
-            'Кол-во комнат?',
-            reply_markup=builder.as_markup(resize_keyboard=True),
-        )
-    else:
-        await message.answer("Введите числовое значение")
-
-
-@order_router.message(Calculate.rooms_number)
-async def get_rooms_number(message: Message, state: FSMContext) -> None:
-    if message.text in ['1', '2', '3', '4', 'Студия']:
-        await state.update_data(rooms_number=message.text)
-        await state.set_state(Calculate.user_choices)
-        keyboard = buttons('Проверка площади ❌', 'area_check')
-        await message.answer(
-                            'Выберите дополнительные услуги:\n'
-                            'Замер фактической площади квартиры. Выполняется от руки на бланке компании.',
-                            reply_markup=keyboard.as_markup()
-                            )
-        keyboard = buttons('Оценка для банка ❌', 'bank_evaluation')
-        await message.answer('Оценка квартиры для банка при ипотеке. Работаем со всеми банками',
-                            reply_markup=keyboard.as_markup())
-        keyboard = buttons('Тепловизионный осмотр ❌', 'thermal_imaging_inspection')
-        await message.answer('Проверка монтажных швов оконных блоков и фасадных стен на промерзание',
-                            reply_markup=keyboard.as_markup())
-        keyboard = buttons('План квартиры в AutoCAD ❌', 'apartment_plan')
-        await message.answer('Подробный план квартиры с указанием размеров всех стен и высот',
-                            reply_markup=keyboard.as_markup())
-        keyboard = buttons('Экспертиза ремонта ❌', 'repair_examination')
-        await message.answer('Строительная экспертиза качества ремонтных работ для суда. Бесплатно при заказе юридических услуг.',
-                            reply_markup=keyboard.as_markup())
-        keyboard = buttons('Юридическое взыскание ❌', 'legal_penalty')
-        await message.answer('Взыскание компенсации с застройщика за некачественный ремонт и нарушение сроков сдачи',
-                            reply_markup=keyboard.as_markup())
-        keyboard = buttons('Замер радиации ❌', 'radiation_measurement')
-        await message.answer('Измерение уровня радиационного фона в помещениях квартиры',
-                            reply_markup=keyboard.as_markup())
-        keyboard = buttons('Тепловизионный отчет ❌', 'thermal_imaging_report')
-        await message.answer('Отчет с термограммами и фотографиями промерзаний с приложением сертификатов',
-                            reply_markup=keyboard.as_markup())
-        keyboard = buttons('Выезд специалиста НОПРИЗ или НОСТРОЙ ❌', 'specialist_visit')
-        await message.answer('Приемка квартиры специалистом из реестра НОПРИЗ или НОСТРОЙ, с предоставлением застройщику документов из реестра и СРО компании.',
-                            reply_markup=keyboard.as_markup())
-        builder = ReplyKeyboardBuilder()
-        builder.row(
-            KeyboardButton(text="продолжить"),
-        )
-        await message.answer('Нажмите "продолжить" для рассчета стоимости.', reply_markup=builder.as_markup(resize_keyboard=True))
-    else:
-        await message.answer("Нажмите одну из кнопок ниже.")
+def selected_services(pricing: Pricing, data: Dict[str, Any]) -> List[str]:
+    return [service_id for service_id in data.get('services', []) if service_id in pricing.services]
 
 
-def buttons(button_text, button_callback_data):
-    keyboard = InlineKeyboardBuilder()
-    keyboard.row(InlineKeyboardButton(text=button_text, callback_data=button_callback_data))
-    return keyboard
+def services_picker(data: Dict[str, Any]) -> Tuple[str, InlineKeyboardMarkup]:
+    pricing = pricing_file.get()
+    selected = selected_services(pricing, data)
+    total = pricing.quote(int(data['house_area']), data['rooms_number'], selected)
+    text = 'Выберите дополнительные услуги:\n\n'
+    text += '\n'.join(f'• {service.label}. {service.description}' for service in pricing.services.values())
+    text += f'\n\nСтоимость с выбранными услугами: {total} руб.\nНажмите "продолжить" для рассчета стоимости.'
+    return text, keyboards.services_keyboard(pricing.choices, frozenset(selected), CALCULATE_CALLBACK)
 
 
-@order_router.callback_query(lambda query: query.data in ['area_check', 'bank_evaluation', 'thermal_imaging_inspection', 'apartment_plan', 'repair_examination', 'legal_penalty', 'radiation_measurement', 'thermal_imaging_report', 'specialist_visit'])
+@order_index.callback_query(
+    lambda query, raw_state: raw_state == Calculate.user_choices.state
+    and query.data in pricing_file.get().services
+)
 async def button_callback(query: CallbackQuery, state: FSMContext):
-    button_data = query.data
-    current_text = query.message.reply_markup.inline_keyboard
-    for row in current_text:
-        for button in row:
-            if button.callback_data == button_data:
-                if button.text.endswith('❌'):
-                    button.text = button.text[:-1] + '✅'
-                    if button.text not in Calculate.services and button.text.endswith('❌') is False:
-                        Calculate.services.append(button.text)
-                else:
-                    if button.text in Calculate.services:
-                        Calculate.services.remove(button.text)
-                        button.text = button.text[:-1] + '❌'
-    await query.message.edit_reply_markup(reply_markup=query.message.reply_markup)
-
-
-@order_router.message(Calculate.user_choices)
+    # Answer first so the client stops its spinner; the edit follows once the
+    # user pauses, carrying only the final selection.
+    await query.answer()
+    chat_id, message_id = query.message.chat.id, query.message.message_id
+    async with message_locks.hold(chat_id, message_id):
+        data = await state.get_data()
+        services = data.get('services', [])
+        if query.data in services:
+            services.remove(query.data)
+        else:
+            services.append(query.data)
+        data = await state.update_data(services=services)
+        text, keyboard = services_picker(data)
+        debounced_edits.edit(query.bot, chat_id, message_id, text, keyboard)
+
+
+@order_index.callback(CALCULATE_CALLBACK, state=Calculate.user_choices)
+async def calculate_callback(query: CallbackQuery, state: FSMContext) -> None:
+    await query.answer()
+    # Waits for toggles still being saved, so the quote includes them.
+    async with message_locks.hold(query.message.chat.id, query.message.message_id):
+        debounced_edits.discard(query.message.chat.id, query.message.message_id)
+        await query.message.edit_reply_markup(reply_markup=None)
+        await cost_calculation(query.message, state)
+
+
+@order_index.state(Calculate.user_choices)
 async def cost_calculation(message: Message, state: FSMContext) -> None:
-    if len(Calculate.services) != 0:
-        await message.answer('Вы выбрали следующие услуги:')
-        await message.answer('\n'.join(Calculate.services))   
     data = await state.get_data()
+    pricing = pricing_file.get()
+    services = selected_services(pricing, data)
+    if len(services) != 0:
+        await message.answer('Вы выбрали следующие услуги:')
+        await message.answer('\n'.join(f'{pricing.services[service_id].label} ✅' for service_id in services))
     house_area = int(data.get('house_area'))
     rooms_number = data.get('rooms_number')
-    service_cost = await calculations(house_area, rooms_number, Calculate.services)
+    service_cost = await calculations(house_area, rooms_number, services)
     await state.clear()
-    Calculate.services.clear()
-    await message.answer(f'Стоимость приемки квартиры составляет: {service_cost} руб.', reply_markup=ReplyKeyboardRemove())
-
-
-async def calculations(house_area, rooms_number, services) -> None:
-    services_cost = house_area * 80
-    for service in services:
-        if service == 'Проверка площади ✅':
-            if rooms_number == 'Студия':
-                services_cost += 200
-            elif rooms_number == '1':
-                services_cost += 300
-            elif rooms_number == '2':
-                services_cost += 400
-            elif rooms_number == '3':
-                services_cost += 500
-            else:
-                services_cost += 600
-        elif service == 'Оценка для банка ✅':
-            services_cost += 3500
-        elif service == 'Тепловизионный осмотр ✅':
-            if rooms_number == 'Студия':
-                services_cost += 1000
-            elif rooms_number == '1':
-                services_cost += 1500
-            elif rooms_number == '2':
-                services_cost += 2000
-            elif rooms_number == '3':
-                services_cost += 2500
-            else:
-                services_cost += 3000
-        elif service == 'План квартиры в AutoCAD ✅':
-            if rooms_number == 'Студия':
-                services_cost += 2500
-            elif rooms_number == '1':
-                services_cost += 3000
-            elif rooms_number == '2':
-                services_cost += 3500
-            elif rooms_number == '3':
-                services_cost += 4000
-            else:
-                services_cost += 5000
-        elif service == 'Замер радиации ✅':
-            services_cost += 500
-        elif service == 'Тепловизионный отчет ✅':
-            services_cost += 1500
-        elif service == 'Выезд специалиста НОПРИЗ или НОСТРОЙ ✅':
-            services_cost += 40 * house_area
-    return services_cost
-
-
-@order_router.message()
-async def message_answer(message: Message) -> None:
-    await message.reply("Чтобы произвести расчет стоимости приемки квартиры воспользуйтесь кнопкой меню.")
+    await message.answer(f'Стоимость приемки квартиры составляет: {service_cost} руб.', reply_markup=keyboards.REMOVE)
 
 
-async def main():
-    dp = Dispatcher()
+async def calculations(house_area, rooms_number, services) -> int:
+    return pricing_file.get().quote(house_area, rooms_number, services)
+
+
+@order_index.command("quote")
+async def start_quote(message: Message, state: FSMContext) -> None:
+    await state.set_state(Quote.price_list)
+    await message.answer(
+        'Пришлите CSV-файл с колонками area (площадь), rooms (кол-во комнат) и services '
+        '(услуги через "|"), и я добавлю к каждой строке стоимость.\n'
+        'Для отмены набейте "cancel".'
+    )
+
+
+# Pricing an uploaded file is CPU-heavy; replies asking for a file do not count.
+price_list_limiter = throttling.ActionLimiter("price_list", Limit(rate=10 / 3600, burst=5))
+
+
+@order_index.state(Quote.price_list)
+async def quote_price_list(message: Message, state: FSMContext) -> None:
+    if message.document is None:
+        await message.reply("Пришлите, пожалуйста, CSV-файл.")
+        return
+    if not price_list_limiter.allow(message.from_user.id):
+        await message.answer(throttling.WARNING_TEXT)
+        return
+    await state.clear()
+    upload = await message.bot.download(message.document)
+    try:
+        result, rows, total = await asyncio.to_thread(quote_file, pricing_file.get(), upload.getvalue())
+    except ValueError as error:
+        await message.answer(f"Не удалось рассчитать файл: {error}")
+        return
+    filename = (message.document.file_name or "flats.csv").rsplit(".", 1)[0] + "_priced.csv"
+    await message.answer_document(
+        BufferedInputFile(result, filename=filename),
+        caption=f"Рассчитано квартир: {rows}, общая стоимость: {total} руб.",
+    )
+
+
+# Service toggles are coalesced into one edit, but each still needs an answer.
+THROTTLE_LIMITS = {
+    "callback": Limit(rate=2, burst=6, action="warn"),
+}
+
+
+def create_dispatcher(storage: Optional[BaseStorage] = None) -> Dispatcher:
+    dp = Dispatcher(storage=storage or create_storage())
+    dp.shutdown.register(debounced_edits.close)
+    dp.shutdown.register(relay_map.close)
     dp.include_router(order_router)
-    await dp.start_polling(bot2)
+    idempotency.setup(dp)
+    throttling.setup(dp, THROTTLE_LIMITS)
+    scheduler.setup(
+        dp,
+        {Calculate: 'Вы не закончили расчет стоимости приемки. Ответьте на последний вопрос или наберите "cancel".'},
+    )
+    metrics.setup(dp)
+    return dp
+
+
+async def main():
+    dp = create_dispatcher()
+    if config.BOT_MODE == "webhook":
+        await webhook.serve([(dp, bot2, "homebot")])
+    else:
+        await dp.start_polling(bot2)
 
 
 if __name__ == "__main__":
@@ -1,29 +1,64 @@
 import asyncio
+import hashlib
+import io
+import json
 import logging
-import os
 import sys
-import datetime
+import uuid
 
-from typing import Any, Dict
-from aiogram import Dispatcher, F, Router, html
-from aiogram.filters import Command, CommandStart
+from typing import Any, Dict, Optional, Tuple
+from aiogram import Bot, Dispatcher, Router, html
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.utils.markdown import hbold
-from aiogram.utils.keyboard import (
-    ReplyKeyboardBuilder,
-    InlineKeyboardBuilder,
-    InlineKeyboardButton,
-)
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.types import (
-    KeyboardButton,
-    Message,
-    ReplyKeyboardRemove,
+    BufferedInputFile,
     FSInputFile,
+    Message,
+    InputMediaPhoto,
 )
+from aiogram.exceptions import TelegramAPIError
 from settings import bot
+from assets import asset_pipeline
+from media_cache import MediaCache
+from order_sink import OrderSink
+from order_store import OrderStore, format_order
+from order_stats import DIMENSIONS, OrderStats
+from outbound import manager_digest, outbound
+from storage import create_storage
+from broadcast import BroadcastLog, Broadcaster, parse_segment
+from dispatch_index import DispatchIndex
+from common import register_common_handlers
+from relay import relay_map
+import config
+import keyboards
+import idempotency
+import metrics
+import scheduler
+import throttling
+from questionnaire import Question, Questionnaire
+from throttling import Limit
+import webhook
 
 order_router = Router()
+order_index = DispatchIndex()
+order_index.attach(order_router)
+media_cache = MediaCache(config.MEDIA_CACHE_PATH)
+order_store = OrderStore()
+order_sink = OrderSink(order_store)
+broadcast_log = BroadcastLog()
+broadcaster = Broadcaster(broadcast_log, outbound)
+order_stats = OrderStats()
+
+STYLE_PHOTOS = (
+    ("images/Classic_style.jpg", "классический"),
+    ("images/Hitech_style.jpg", "хайтек"),
+    ("images/Loft_style.jpg", "лофт"),
+    ("images/Minimalism_style.jpg", "минимализм"),
+    ("images/Modern_classic_style.jpg", "современная классика"),
+    ("images/Modern_style.jpg", "современный стиль"),
+    ("images/Neoclassic_style.jpg", "неоклассика"),
+)
 
 
 class Order(StatesGroup):
@@ -37,7 +72,10 @@ class Order(StatesGroup):
     how_to_tell = State()
     save_order = State()
     phone_number = State()
-    order = {}
+
+
+MENU_HINT = "Для оформления заказа воспользуйтесь кнопками меню."
+register_common_handlers(order_index, MENU_HINT, relay=relay_map)
 
 
 class Forward(StatesGroup):
@@ -45,43 +83,25 @@ class Forward(StatesGroup):
     message_to_send = State()
 
 
-@order_router.message(CommandStart())
-async def command_start_handler(message: Message) -> None:
-    await message.answer(
-        f"Привет {hbold(message.from_user.full_name)}!\nЯ Чат-бот!\n"
-        "Для оформления заказа воспользуйтесь кнопками меню.",
-        reply_markup=ReplyKeyboardRemove(),
-    )
-
-
-@order_router.message(Command("cancel"))
-@order_router.message(F.text.casefold() == "cancel")
-async def cancel_handler(message: Message, state: FSMContext) -> None:
-    current_state = await state.get_state()
-    if current_state is None:
-        return
-    logging.info("Cancelling state %r", current_state)
-    await state.clear()
-    await message.answer(
-        "Отменено",
-        reply_markup=ReplyKeyboardRemove(),
-    )
+class Broadcast(StatesGroup):
+    message_to_send = State()
+    confirm = State()
 
 
-@order_router.message(Command("forward"))
+@order_index.command("forward")
 async def start_forward_message(message: Message, state: FSMContext) -> None:
     await state.set_state(Forward.client_id)
     await message.answer("Напишите Id клиента, которому хотите отправить сообщение")
 
 
-@order_router.message(Forward.client_id)
+@order_index.state(Forward.client_id)
 async def get_client_id(message: Message, state: FSMContext) -> None:
     await state.update_data(client_id=message.text)
     await state.set_state(Forward.message_to_send)
     await message.answer("Напишите текст сообщения или приложите фото")
 
 
-@order_router.message(Forward.message_to_send)
+@order_index.state(Forward.message_to_send)
 async def get_message(message: Message, state: FSMContext) -> None:
     data = await state.update_data(message_to_send=message.chat.id)
     await end_forward_message(message=message, data=data)
@@ -91,275 +111,210 @@ async def get_message(message: Message, state: FSMContext) -> None:
 async def end_forward_message(message: Message, data: Dict[str, Any]) -> None:
     client_id = data["client_id"]
     from_id = message.chat.id
-    await bot.forward_message(
-        chat_id=client_id, from_chat_id=from_id, message_id=message.message_id
+    await outbound.send(
+        client_id,
+        lambda: message.bot.copy_message(
+            chat_id=client_id, from_chat_id=from_id, message_id=message.message_id
+        ),
     )
 
 
-@order_router.message(Command("links"))
-async def get_info_links(message: Message):
-    builder = InlineKeyboardBuilder()
-    builder.row(
-        InlineKeyboardButton(
-            text="Участвуй в STandARTup проекте", url="https://housedecor.pro/start"
-        )
-    )
-    builder.row(
-        InlineKeyboardButton(
-            text="Перейти на сайт HouseDecor", url="https://housedecor.pro/"
-        )
-    )
+BROADCAST_USAGE = (
+    "Получатели выбираются по параметрам команды, например:\n"
+    "/broadcast from=2024-01-01; to=2024-02-01; style=лофт; city=Челн"
+)
+
+
+@order_index.command("broadcast")
+async def start_broadcast(message: Message, state: FSMContext) -> None:
+    if message.from_user.id != config.MANAGER_ID:
+        await message.reply(MENU_HINT)
+        return
+    try:
+        segment = parse_segment(message.text)
+    except ValueError as error:
+        await message.answer(f"Не удалось разобрать условия рассылки: {error}.\n{BROADCAST_USAGE}")
+        return
+    recipients = await asyncio.to_thread(order_store.segment, **segment)
+    if not recipients:
+        await message.answer("Нет клиентов, подходящих под условия рассылки.")
+        return
+    await state.set_state(Broadcast.message_to_send)
+    await state.update_data(segment=message.text)
     await message.answer(
-        "По ссылкам ниже вы можете ознакомиться с нашими проектами:",
-        reply_markup=builder.as_markup(),
+        f"Получателей: {len(recipients)}.\nНапишите текст рассылки или приложите фото.\n{BROADCAST_USAGE}"
     )
 
 
-@order_router.message(Command("order"))
-async def get_order(message: Message, state: FSMContext) -> None:
-    await state.set_state(Order.overhauls_place)
-    builder = ReplyKeyboardBuilder()
-    builder.row(
-        KeyboardButton(text="в новостройке")
-        )
-    builder.row(
-        KeyboardButton(text="во вторичном жилье")
-    )
-    builder.row(
-        KeyboardButton(text="в доме")
-    )
+@order_index.state(Broadcast.message_to_send)
+async def get_broadcast_message(message: Message, state: FSMContext) -> None:
+    data = await state.update_data(message_id=message.message_id)
+    recipients = await asyncio.to_thread(order_store.segment, **parse_segment(data["segment"]))
+    await state.set_state(Broadcast.confirm)
     await message.answer(
-        'Для отмены набейте "cancel".\nОтветьте, пожалуйста, на ряд вопросов:'
+        f"Сообщение выше получат клиентов: {len(recipients)}. Отправить?",
+        reply_markup=keyboards.CONFIRM_BROADCAST.markup,
     )
-    await message.answer(
-        "Где планируется ремонт?",
-        reply_markup=builder.as_markup(resize_keyboard=True),
+
+
+@order_index.text("✅ отправить", state=Broadcast.confirm)
+async def confirm_broadcast(message: Message, state: FSMContext) -> None:
+    data = await state.get_data()
+    await state.clear()
+    recipients = await asyncio.to_thread(order_store.segment, **parse_segment(data["segment"]))
+    if not recipients:
+        await message.answer("Нет клиентов, подходящих под условия рассылки.", reply_markup=keyboards.REMOVE)
+        return
+    status = await message.answer(
+        f"Рассылка запущена, получателей: {len(recipients)}", reply_markup=keyboards.REMOVE
     )
+    broadcast_id = await asyncio.to_thread(
+        broadcast_log.create, message.chat.id, data["message_id"], status.message_id, recipients
+    )
+    broadcaster.start(message.bot, broadcast_id)
 
 
-@order_router.message(Order.overhauls_place)
-async def get_overhauls_place(message: Message, state: FSMContext) -> None:
-    if message.text in ["в новостройке", "во вторичном жилье", "в доме"]:
-        await state.update_data(overhauls_place=message.text)
-        await state.set_state(Order.house_area)
-        await message.answer(
-            "Какая у вас площадь квартиры/дома?",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-    else:
-        await message.answer(
-            "Нажмите одну из кнопок ниже.",
-        )
+@order_index.text("❌ отмена", state=Broadcast.confirm)
+async def cancel_broadcast(message: Message, state: FSMContext) -> None:
+    await state.clear()
+    await message.answer("Рассылка отменена.", reply_markup=keyboards.REMOVE)
 
 
-@order_router.message(Order.house_area)
-async def get_house_area(message: Message, state: FSMContext) -> None:
-    if message.text.isdigit():
-        await state.update_data(house_area=message.text)
-        await state.set_state(Order.interior_style)
-        photo_classic = FSInputFile("images/Classic_style.jpg")
-        photo_hitech = FSInputFile("images/Hitech_style.jpg")
-        photo_loft = FSInputFile("images/Loft_style.jpg")
-        photo_minimalistic = FSInputFile("images/Minimalism_style.jpg")
-        photo_modern_classic = FSInputFile("images/Modern_classic_style.jpg")
-        photo_modern = FSInputFile("images/Modern_style.jpg")
-        photo_neoclassic = FSInputFile("images/Neoclassic_style.jpg")
-
-        await bot.send_photo(
-            chat_id=message.chat.id,
-            photo=photo_classic,
-            caption="классический",
-        )
-        await bot.send_photo(
-            chat_id=message.chat.id,
-            photo=photo_hitech,
-            caption="хайтек",
-        )
-        await bot.send_photo(
-            chat_id=message.chat.id,
-            photo=photo_loft,
-            caption="лофт",
-        )
-        await bot.send_photo(
-            chat_id=message.chat.id,
-            photo=photo_minimalistic,
-            caption="минимализм",
-        )
-        await bot.send_photo(
-            chat_id=message.chat.id,
-            photo=photo_modern_classic,
-            caption="современная классика",
-        )
-        await bot.send_photo(
-            chat_id=message.chat.id,
-            photo=photo_modern,
-            caption="современный стиль",
-        )
-        await bot.send_photo(
-            chat_id=message.chat.id,
-            photo=photo_neoclassic,
-            caption="неоклассика",
-        )
-        builder = ReplyKeyboardBuilder()
-        builder.row(
-            KeyboardButton(text="классический"),
-            KeyboardButton(text="лофт")
-        )
-        builder.row(
-            KeyboardButton(text="минимализм"),
-            KeyboardButton(text="неоклассика")
-        )
-        builder.row(
-            KeyboardButton(text="современная классика")
-            )
-        builder.row(
-            KeyboardButton(text="современный стиль")
-        )
-        builder.row(
-            KeyboardButton(text="хайтек")
-        )
-        await message.answer(
-            "В каком стиле вы хотите интерьер?",
-            reply_markup=builder.as_markup(resize_keyboard=True),
-        )
-    else:
-        await message.answer("Цифрами, пожалуйста.")
-
-
-@order_router.message(Order.interior_style)
-async def get_interior_style(message: Message, state: FSMContext) -> None:
-    if message.text in [
-        "классический", "лофт", "минимализм", "неоклассика",
-        "современная классика", "современный стиль", "хайтек"
-    ]:
-        await state.update_data(interior_style=message.text)
-        await state.set_state(Order.design_project)
-        builder = ReplyKeyboardBuilder()
-        builder.row(
-            KeyboardButton(text="Да"),
-            KeyboardButton(text="Нет"),
-        )
-        builder.row(
-            KeyboardButton(text="Пока думаю"),
-        )
-        await message.answer(
-            "Нужен ли дизайн-проект?",
-            reply_markup=builder.as_markup(resize_keyboard=True),
-        )
-    else:
-        await message.answer("Нажмите одну из кнопок ниже.")
-
-
-@order_router.message(Order.design_project)
-async def get_design_project(message: Message, state: FSMContext) -> None:
-    if message.text in ["Да", "Нет", "Пока думаю"]:
-        await state.update_data(design_project=message.text)
-        await state.set_state(Order.overhauls_date)
-        builder = ReplyKeyboardBuilder()
-        builder.row(
-            KeyboardButton(text="в течение 2-х недель")
-            )
-        builder.row(
-            KeyboardButton(text="в течение этого месяца")
-        )
-        builder.row(
-            KeyboardButton(text="в следующем месяце")
-            )
-        builder.row(
-            KeyboardButton(text="другое")
-        )
-        await message.answer(
-            "Когда планируете начать ремонт?",
-            reply_markup=builder.as_markup(resize_keyboard=True)
-        )
-    else:
-        await message.answer("Нажмите одну из кнопок ниже.")
-
-
-@order_router.message(Order.overhauls_date)
-async def get_overhauls_date(message: Message, state: FSMContext) -> None:
-    if message.text in [
-        "в течение 2-х недель", "в течение этого месяца", "в следующем месяце", "другое"
-    ]:
-        await state.update_data(overhauls_date=message.text)
-        await state.set_state(Order.address)
-        await message.answer(
-            "Напишите название ЖК или адрес.",
-            reply_markup=ReplyKeyboardRemove()
-        )
-    else:
-        await message.answer("Нажмите одну из кнопок ниже.")
+@order_index.state(Broadcast.confirm)
+async def choose_broadcast_answer(message: Message) -> None:
+    await message.reply("Нажмите, пожалуйста, кнопку «отправить» или «отмена»")
 
 
-@order_router.message(Order.address)
-async def get_address(message: Message, state: FSMContext) -> None:
-    await state.update_data(address=message.text)
-    await state.set_state(Order.your_location)
-    builder = ReplyKeyboardBuilder()
-    builder.row(
-        KeyboardButton(text="в Набережных Челнах")
-        )
-    builder.row(
-        KeyboardButton(text="в другом городе")
+async def resume_broadcasts(bot: Bot) -> None:
+    await broadcaster.resume(bot)
+
+
+def build_stats_report() -> Tuple[str, bytes]:
+    order_stats.update(order_store)
+    charts = "\n\n".join(
+        f"{html.bold(title)}:\n{html.pre(html.quote(order_stats.chart(name)))}" for name, _, title in DIMENSIONS
     )
-    builder.row(
-        KeyboardButton(text="другое")
+    table = io.StringIO()
+    order_stats.write_csv(table)
+    return charts, table.getvalue().encode("utf-8-sig")
+
+
+@order_index.command("stats")
+async def get_stats(message: Message) -> None:
+    if message.from_user.id != config.MANAGER_ID:
+        await message.reply(MENU_HINT)
+        return
+    charts, table = await asyncio.to_thread(build_stats_report)
+    await message.answer(charts, parse_mode="HTML")
+    await message.answer_document(
+        BufferedInputFile(table, filename="order_stats.csv"),
+        caption="Заказы по месяцам: стиль, город, начало ремонта",
     )
+
+
+@order_index.command("links")
+async def get_info_links(message: Message):
     await message.answer(
-        "Где вы будете находится во время ремонта?",
-        reply_markup=builder.as_markup(resize_keyboard=True),
+        "По ссылкам ниже вы можете ознакомиться с нашими проектами:",
+        reply_markup=keyboards.LINKS,
     )
 
 
-@order_router.message(Order.your_location)
-async def get_your_location(message: Message, state: FSMContext) -> None:
-    if message.text in [
-        "в Набережных Челнах", "в другом городе", "другое"
-    ]:
-        await state.update_data(your_location=message.text)
-        await state.set_state(Order.how_to_tell)
-        builder = ReplyKeyboardBuilder()
-        builder.row(
-            KeyboardButton(text="по WhatsApp"),
-            KeyboardButton(text="в Telegram"),
-        )
-        builder.row(
-            KeyboardButton(text="по телефону"),
-        )
-        await message.answer(
-            "Как вам сообщить о результатах расчета стоимости?",
-            reply_markup=builder.as_markup(resize_keyboard=True),
+@order_index.command("order")
+async def get_order(message: Message, state: FSMContext) -> None:
+    await state.set_data({"conversation_id": uuid.uuid4().hex})
+    await message.answer(
+        'Для отмены набейте "cancel".\nОтветьте, пожалуйста, на ряд вопросов:'
+    )
+    await order_questionnaire.start(message, state)
+
+
+async def send_style_gallery(bot: Bot, chat_id: int) -> None:
+    paths = await asyncio.gather(*(asset_pipeline.variant(path) for path, _ in STYLE_PHOTOS))
+    captions = [caption for _, caption in STYLE_PHOTOS]
+    media = [
+        InputMediaPhoto(media=media_cache.photo(bot.id, path), caption=caption)
+        for path, caption in zip(paths, captions)
+    ]
+    try:
+        sent = await bot.send_media_group(chat_id=chat_id, media=media)
+    except TelegramAPIError as error:
+        logging.warning("Sending style album failed, sending photos one by one: %s", error)
+        # A stale file_id fails the whole album and does not say which one,
+        # so every photo is uploaded from disk.
+        media_cache.forget(bot.id, paths)
+        sent = await asyncio.gather(
+            *(
+                bot.send_photo(chat_id=chat_id, photo=FSInputFile(path), caption=caption)
+                for path, caption in zip(paths, captions)
+            ),
+            return_exceptions=True,
         )
-    else:
-        await message.answer("Нажмите одну из кнопок ниже.")
+    for path, photo_message in zip(paths, sent):
+        if isinstance(photo_message, BaseException):
+            logging.warning("Sending style photo %s failed: %s", path, photo_message)
+        else:
+            media_cache.remember(bot.id, path, photo_message)
 
 
-@order_router.message(Order.how_to_tell)
-async def get_how_to_tell(message: Message, state: FSMContext) -> None:
-    if message.text in ["по WhatsApp", "в Telegram", "по телефону"]:
-        await state.update_data(how_to_tell=message.text)
-        await state.set_state(Order.phone_number)
-        await message.answer(
-            "Напишите свой номер телефона.",
-            reply_markup=ReplyKeyboardRemove(),
-        )
-    else:
-        await message.answer("Нажмите одну из кнопок ниже.")
+# Sending the gallery is the expensive part of the area step, so only that is
+# limited: answers that fail validation never count against it.
+style_gallery_limiter = throttling.ActionLimiter("style_gallery", Limit(rate=5 / 3600, burst=5))
 
 
-@order_router.message(Order.phone_number)
-async def get_phone_number(message: Message, state: FSMContext) -> None:
-    if message.text.isdigit() and len(message.text) >= 6:
-        data = await state.update_data(phone_number=message.text)
-        await state.set_state(Order.save_order)
-        await show_summary(message=message, data=data)
-    else:
-        await message.answer("Не корректный номер.")
+async def attach_style_gallery(message: Message) -> None:
+    # Past the limit the client has seen the gallery several times this hour;
+    # the question and its keyboard still go out.
+    if style_gallery_limiter.allow(message.from_user.id):
+        await send_style_gallery(message.bot, message.chat.id)
+
+
+async def confirm_order(message: Message, state: FSMContext, data: Dict[str, Any]) -> None:
+    await state.set_state(Order.save_order)
+    await show_summary(message=message, state=state, data=data)
+
+
+order_questionnaire = Questionnaire(
+    [
+        Question(Order.overhauls_place, "Где планируется ремонт?", keyboards.OVERHAULS_PLACE),
+        Question(
+            Order.house_area,
+            "Какая у вас площадь квартиры/дома?",
+            validator=str.isdigit,
+            error="Цифрами, пожалуйста.",
+        ),
+        Question(
+            Order.interior_style,
+            "В каком стиле вы хотите интерьер?",
+            keyboards.INTERIOR_STYLE,
+            attachment=attach_style_gallery,
+        ),
+        Question(Order.design_project, "Нужен ли дизайн-проект?", keyboards.DESIGN_PROJECT),
+        Question(Order.overhauls_date, "Когда планируете начать ремонт?", keyboards.OVERHAULS_DATE),
+        Question(Order.address, "Напишите название ЖК или адрес."),
+        Question(
+            Order.your_location,
+            "Где вы будете находится во время ремонта?",
+            keyboards.YOUR_LOCATION,
+        ),
+        Question(
+            Order.how_to_tell,
+            "Как вам сообщить о результатах расчета стоимости?",
+            keyboards.HOW_TO_TELL,
+        ),
+        Question(
+            Order.phone_number,
+            "Напишите свой номер телефона.",
+            validator=lambda text: text.isdigit() and len(text) >= 6,
+            error="Не корректный номер.",
+        ),
+    ],
+    on_complete=confirm_order,
+)
+order_questionnaire.register(order_index)
 
 
-async def show_summary(message: Message, data: Dict[str, Any]) -> None:
-    builder = ReplyKeyboardBuilder()
-    builder.row(KeyboardButton(text="✅ да"), KeyboardButton(text="❌ нет"))
+async def show_summary(message: Message, state: FSMContext, data: Dict[str, Any]) -> None:
     overhauls_place = data["overhauls_place"]
     house_area = data["house_area"]
     interior_style = data["interior_style"]
@@ -369,17 +324,20 @@ async def show_summary(message: Message, data: Dict[str, Any]) -> None:
     your_location = data["your_location"]
     how_to_tell = data["how_to_tell"]
     phone_number = data["phone_number"]
-    Order.order["Id клиента"] = message.from_user.id
-    Order.order["Имя клиента"] = message.from_user.full_name
-    Order.order["Ремонт планируется"] = overhauls_place
-    Order.order["Площадь дома/квартиры"] = house_area
-    Order.order["Интерьер в стиле"] = interior_style
-    Order.order["Нужен ли дизайн проект?"] = design_project
-    Order.order["Начало ремонта"] = overhauls_date
-    Order.order["Адрес клиента"] = address
-    Order.order["Во время ремонта клиент будет находиться"] = your_location
-    Order.order["Стоимость ремонта сообщить"] = how_to_tell
-    Order.order["Телефон клиента"] = phone_number
+    order = {
+        "client_id": message.from_user.id,
+        "client_name": message.from_user.full_name,
+        "overhauls_place": overhauls_place,
+        "house_area": house_area,
+        "interior_style": interior_style,
+        "design_project": design_project,
+        "overhauls_date": overhauls_date,
+        "address": address,
+        "your_location": your_location,
+        "how_to_tell": how_to_tell,
+        "phone_number": phone_number,
+    }
+    await state.update_data(order=order)
     text = "Давайте еще раз перепроверим:\n"
     text += f"1. Ремонт планируется {html.quote(overhauls_place)}\n"
     text += f"2. Площадь вашего дома/квартиры {html.quote(house_area)} м2\n"
@@ -394,63 +352,108 @@ async def show_summary(message: Message, data: Dict[str, Any]) -> None:
     text += f"9. Ваш номер телефона {html.quote(phone_number)}\n"
     text += "Всё верно?"
     await message.answer(
-        text=text, reply_markup=builder.as_markup(resize_keyboard=True)
+        text=text, reply_markup=keyboards.CONFIRM_ORDER.markup
     )
 
 
-@order_router.message(Order.save_order, F.text.casefold() == "✅ да")
-async def saving_order(message: Message, state: FSMContext) -> None:
+@order_index.text("✅ да", state=Order.save_order)
+async def saving_order(message: Message, state: FSMContext, dedup: idempotency.Deduplicator) -> None:
+    data = await state.get_data()
+    # A double tap or a redelivered update must not save the order twice.
+    conversation = data.get("conversation_id") or hashlib.sha256(
+        json.dumps(data["order"], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    claim = f"order:{message.from_user.id}:{conversation}"
+    if not await dedup.claim(claim):
+        return
+    try:
+        order_id = await order_sink.save(data["order"])
+    except Exception:
+        # The state is kept, so tapping "✅ да" again retries the save.
+        logging.exception("Saving an order failed")
+        await dedup.release(claim)
+        await message.answer("Не удалось сохранить заказ. Нажмите, пожалуйста, «✅ да» ещё раз.")
+        return
     await state.clear()
-    manager_id = 6704840056
-    str_order = "\n".join([f"{key}: {value}" for key, value in Order.order.items()])
-    file_name = "Order_from_[%TDd][%TDm][%TDY]_[%TDH]_[%TDM].txt"
-    new_file_name = "orders/" + get_file_name(file_name)
-    os.makedirs("orders", exist_ok=True)
-    with open(new_file_name, "w", encoding="utf-8") as file:
-        file.write(str_order)
-    input_file = FSInputFile(new_file_name)
-    await bot.send_document(chat_id=manager_id, document=input_file)
+    await manager_digest.add(message.bot, order_id, format_order(data["order"]))
+    if config.ORDER_FOLLOWUP_DELAY:
+        await scheduler.scheduler.schedule(
+            f"order_followup:{order_id}",
+            "order_followup",
+            config.ORDER_FOLLOWUP_DELAY,
+            {"order_id": order_id},
+            bot_id=message.bot.id,
+        )
     await message.answer(
         "Спасибо! Ваш заказ обрабатывается. Ожидайте уведомления!",
-        reply_markup=ReplyKeyboardRemove(),
+        reply_markup=keyboards.REMOVE,
     )
 
 
-def get_file_name(file_name: str):
-    now = datetime.datetime.now()
-    new_file_name = file_name
-    new_file_name = new_file_name.replace("[%TDd]", now.strftime("%d"))
-    new_file_name = new_file_name.replace("[%TDm]", now.strftime("%m"))
-    new_file_name = new_file_name.replace("[%TDY]", now.strftime("%Y"))
-    new_file_name = new_file_name.replace("[%TDH]", now.strftime("%H"))
-    new_file_name = new_file_name.replace("[%TDM]", now.strftime("%M"))
-    return new_file_name
-
-
-@order_router.message(Order.save_order, F.text.casefold() == "❌ нет")
+@order_index.text("❌ нет", state=Order.save_order)
 async def reorder(message: Message, state: FSMContext) -> None:
     await state.clear()
-    Order.order.clear()
     await message.answer(
         'В таком случае снова воспользуйтесь пунктом меню "Оформить заказ".',
-        reply_markup=ReplyKeyboardRemove(),
+        reply_markup=keyboards.REMOVE,
     )
 
 
-@order_router.message(Order.save_order)
+@order_index.state(Order.save_order)
 async def make_a_choice(message: Message) -> None:
     await message.reply("Нажмите, пожалуйста, кнопку да или нет")
 
 
-@order_router.message()
-async def message_answer(message: Message) -> None:
-    await message.reply("Для оформления заказа воспользуйтесь кнопками меню.")
+@scheduler.scheduler.handler("order_followup")
+async def order_followup(bot: Optional[Bot], payload: Dict[str, Any]) -> None:
+    order = await asyncio.to_thread(order_store.get, payload["order_id"])
+    if bot is None or order is None:
+        return
+    text = (
+        f"Напоминание: заказ {order['order_id']} от {order['client_name']}, "
+        f"тел. {order['phone_number']}, ждёт ответа клиенту."
+    )
+    await outbound.send(config.MANAGER_ID, lambda: bot.send_message(config.MANAGER_ID, text))
 
 
-async def main():
-    dp = Dispatcher()
+async def warm_up_media_cache(bot: Bot) -> None:
+    await asset_pipeline.prepare(path for path, _ in STYLE_PHOTOS)
+    if config.MEDIA_CACHE_CHAT_ID:
+        paths = [await asset_pipeline.variant(path) for path, _ in STYLE_PHOTOS]
+        await media_cache.warm_up(bot, config.MEDIA_CACHE_CHAT_ID, paths)
+
+
+# /order is the most expensive command, so a user may only repeat it a few
+# times an hour; the gallery has its own limit above.
+THROTTLE_LIMITS = {
+    "command:order": Limit(rate=3 / 3600, burst=3, action="warn"),
+}
+
+
+def create_dispatcher(storage: Optional[BaseStorage] = None) -> Dispatcher:
+    dp = Dispatcher(storage=storage or create_storage())
+    dp.startup.register(warm_up_media_cache)
+    dp.startup.register(resume_broadcasts)
+    dp.shutdown.register(manager_digest.close)
+    dp.shutdown.register(relay_map.close)
+    dp.shutdown.register(asset_pipeline.close)
     dp.include_router(order_router)
-    await dp.start_polling(bot)
+    idempotency.setup(dp)
+    throttling.setup(dp, THROTTLE_LIMITS)
+    scheduler.setup(
+        dp,
+        {Order: 'Вы не закончили оформление заказа. Ответьте на последний вопрос или наберите "cancel".'},
+    )
+    metrics.setup(dp)
+    return dp
+
+
+async def main():
+    dp = create_dispatcher()
+    if config.BOT_MODE == "webhook":
+        await webhook.serve([(dp, bot, "t_bot")])
+    else:
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: without Pillow the original images are sent
+    Image = None
+
+import config
+
+
+def render_variant(source: str, target: str, max_side: int, quality: int) -> None:
+    """Writes ``source`` scaled to fit ``max_side`` as a progressive JPEG; runs in a worker process."""
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with Image.open(source) as image:
+        fits = max(image.size) <= max_side
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        image.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+    if fits and os.path.getsize(tmp_path) >= os.path.getsize(source):
+        # Re-encoding a small, already compressed image only loses quality.
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+class AssetPipeline:
+    """Builds size-limited copies of images for sending to Telegram.
+
+    Variants are named after the hash of the source content and the render
+    settings, so an unchanged image is never rendered twice, not even across
+    restarts, and an edited one gets a fresh variant. Rendering happens in a
+    process pool.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = config.ASSET_CACHE_DIR,
+        max_side: int = config.GALLERY_MAX_SIDE,
+        quality: int = config.GALLERY_JPEG_QUALITY,
+        workers: int = 2,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_side = max_side
+        self.quality = quality
+        self.workers = workers
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._builds: Dict[str, asyncio.Future] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _variant_path(self, source: str) -> str:
+        stat = os.stat(source)
+        cached = self._digests.get(source)
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            digest = hashlib.sha256(f"{self.max_side}:{self.quality}:".encode())
+            with open(source, "rb") as file:
+                digest.update(file.read())
+            cached = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+            self._digests[source] = cached
+        return os.path.join(self.cache_dir, cached[2] + ".jpg")
+
+    async def _build(self, source: str, target: str) -> None:
+        if self._pool is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._pool, render_variant, source, target, self.max_side, self.quality)
+
+    async def variant(self, source: str) -> str:
+        """Path of the optimised copy of ``source``, rendering it on first use.
+
+        Falls back to ``source`` when Pillow is missing or rendering fails.
+        """
+        if Image is None:
+            return source
+        target = self._variant_path(source)
+        if os.path.exists(target):
+            return target
+        build = self._builds.get(target)
+        if build is None:
+            build = self._builds[target] = asyncio.ensure_future(self._build(source, target))
+            build.add_done_callback(lambda _: self._builds.pop(target, None))
+        try:
+            await asyncio.shield(build)
+        except Exception:
+            logging.exception("Preparing %s failed, sending the original", source)
+            return source
+        return target
+
+    async def prepare(self, sources: Iterable[str]) -> None:
+        """Renders all missing variants up front, e.g. at startup."""
+        if Image is None:
+            logging.info("Pillow is not installed, images are sent as they are")
+            return
+        await asyncio.gather(*(self.variant(source) for source in sources))
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+asset_pipeline = AssetPipeline()
@@ -0,0 +1,180 @@
+import argparse
+import csv
+import io
+import re
+import sys
+import time
+from typing import Dict, List, Sequence, TextIO, Tuple
+
+try:
+    import numpy
+except ImportError:  # optional: the pure-Python path gives the same prices, only slower
+    numpy = None
+
+import config
+from pricing import Pricing, PricingFile
+
+# Header names accepted for each input column.
+COLUMNS = {
+    "area": ("area", "площадь"),
+    "rooms": ("rooms", "комнаты"),
+    "services": ("services", "услуги"),
+}
+SERVICE_SEPARATOR = re.compile(r"[\s,;|+]+")
+# Whole m², at most seven digits so int64 prices stay exact. \d matches
+# exactly what int() accepts as digits, and unlike int() it rejects "1_000".
+AREA = re.compile(r"\s*\d{1,7}\s*")
+MAX_AREA = 9_999_999
+
+
+def _rate_tables(
+    pricing: Pricing, service_sets: Sequence[str], rooms: Sequence[str]
+) -> Tuple[List[int], List[List[int]]]:
+    """Per service set: the price per m² and the flat part of the price per room count.
+
+    ``Pricing.quote`` is ``area * base + sum(by_rooms + fixed + per_sqm * area)``
+    over the chosen services, which regroups exactly into
+    ``area * per_sqm_total + flat_total`` since everything is an integer.
+    """
+    per_sqm: List[int] = []
+    flat: List[List[int]] = []
+    for service_set in service_sets:
+        services = []
+        for service_id in SERVICE_SEPARATOR.split(service_set.strip()):
+            if not service_id:
+                continue
+            if service_id not in pricing.services:
+                raise ValueError(f"unknown service {service_id!r}")
+            services.append(pricing.services[service_id])
+        per_sqm.append(pricing.base_per_sqm + sum(service.per_sqm for service in services))
+        flat.append(
+            [sum(service.by_rooms.get(room, 0) + service.fixed for service in services) for room in rooms]
+        )
+    return per_sqm, flat
+
+
+def _check_areas(areas: Sequence[str]) -> None:
+    if all(map(AREA.fullmatch, areas)):
+        return
+    for line, area in enumerate(areas, start=2):
+        if not AREA.fullmatch(area):
+            raise ValueError(f"line {line}: area must be a whole number up to {MAX_AREA}, got {area!r}")
+
+
+def _canonical_rooms(pricing: Pricing, rooms: Sequence[str], values: Sequence[str]) -> List[str]:
+    """Maps each distinct room count to the price list's spelling ("студия" -> "Студия")."""
+    known = {room.casefold(): room for room in pricing.rooms}
+    canonical = []
+    for value in values:
+        room = known.get(value.strip().casefold()) if known else value
+        if room is None:
+            line = rooms.index(value) + 2
+            raise ValueError(f"line {line}: rooms must be one of {', '.join(pricing.rooms)}, got {value!r}")
+        canonical.append(room)
+    return canonical
+
+
+def _encode(values: Sequence[str]) -> Tuple[List[int], List[str]]:
+    """Replaces each value with the index of its first occurrence among the distinct values."""
+    codes: Dict[str, int] = {}
+    return [codes.setdefault(value, len(codes)) for value in values], list(codes)
+
+
+def quote_columns(pricing: Pricing, areas: Sequence[str], rooms: Sequence[str], services: Sequence[str]) -> List[int]:
+    """Prices every flat; equal to calling ``pricing.quote`` row by row.
+
+    Rates are worked out once per distinct service set and room count, so the
+    per-row work is one multiply-add, done over arrays when numpy is installed.
+    """
+    room_codes, room_values = _encode(rooms)
+    set_codes, set_values = _encode(services)
+    per_sqm, flat = _rate_tables(pricing, set_values, _canonical_rooms(pricing, rooms, room_values))
+    _check_areas(areas)
+    if numpy is None:
+        return [
+            int(area) * per_sqm[service_set] + flat[service_set][room]
+            for area, room, service_set in zip(areas, room_codes, set_codes)
+        ]
+    area = numpy.fromiter(map(int, areas), numpy.int64, len(areas))
+    set_index = numpy.array(set_codes, dtype=numpy.intp)
+    prices = area * numpy.array(per_sqm, dtype=numpy.int64)[set_index]
+    if room_values:
+        prices += numpy.array(flat, dtype=numpy.int64)[set_index, numpy.array(room_codes, dtype=numpy.intp)]
+    return prices.tolist()
+
+
+def _column_index(header: List[str], column: str) -> int:
+    names = [name.strip().casefold() for name in header]
+    for alias in COLUMNS[column]:
+        if alias in names:
+            return names.index(alias)
+    if column == "services":
+        return -1
+    raise ValueError(f"no {column!r} column, expected one of {', '.join(COLUMNS[column])}")
+
+
+def quote_csv(pricing: Pricing, source: TextIO, target: TextIO) -> Tuple[int, int]:
+    """Copies the CSV from ``source`` to ``target`` with a price column added.
+
+    Returns the number of priced rows and their total.
+    """
+    sample = source.read(4096)
+    source.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(source, dialect)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("the file is empty")
+    indexes = [_column_index(header, column) for column in COLUMNS]
+    rows = [row for row in reader if any(row)]
+    area, rooms, services = (
+        [row[index].strip() if 0 <= index < len(row) else "" for row in rows] for index in indexes
+    )
+    prices = quote_columns(pricing, area, rooms, services)
+    writer = csv.writer(target, dialect)
+    writer.writerow(header + ["price"])
+    writer.writerows(row + [price] for row, price in zip(rows, prices))
+    return len(rows), sum(prices)
+
+
+def quote_file(pricing: Pricing, data: bytes) -> Tuple[bytes, int, int]:
+    """``quote_csv`` for an uploaded file; Excel's UTF-8 and cp1251 exports both work."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("cp1251")
+    target = io.StringIO()
+    rows, total = quote_csv(pricing, io.StringIO(text, newline=""), target)
+    return target.getvalue().encode("utf-8-sig"), rows, total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Price a CSV of flats (columns area, rooms, services) with Homebot's price list."
+    )
+    parser.add_argument("input", help="CSV file; services are ids from the price list, separated by spaces or |")
+    parser.add_argument("-o", "--output", help="where to write the priced CSV (default: stdout)")
+    parser.add_argument("--pricing", default=config.PRICING_PATH, help="price list (default: %(default)s)")
+    args = parser.parse_args()
+    pricing = PricingFile(args.pricing).get()
+    started = time.perf_counter()
+    try:
+        with open(args.input, encoding="utf-8-sig", newline="") as source:
+            if args.output:
+                with open(args.output, "w", encoding="utf-8", newline="") as target:
+                    rows, total = quote_csv(pricing, source, target)
+            else:
+                rows, total = quote_csv(pricing, source, sys.stdout)
+    except ValueError as error:
+        sys.exit(f"{args.input}: {error}")
+    print(
+        f"priced {rows} rows, total {total}, in {time.perf_counter() - started:.2f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
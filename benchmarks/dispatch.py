@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import os
+import sys
+import tempfile
+import time
+from typing import Any, List, Optional
+
+from loadtest import CALCULATE_FLOW, ORDER_FLOW
+
+
+async def run(args: argparse.Namespace) -> None:
+    workdir = tempfile.mkdtemp(prefix="bench-dispatch-")
+    os.environ.setdefault("ORDER_STORE_PATH", os.path.join(workdir, "orders.sqlite3"))
+    os.environ.setdefault("MEDIA_CACHE_PATH", os.path.join(workdir, "media_cache.json"))
+    os.environ.setdefault("SCHEDULER_PATH", os.path.join(workdir, "jobs.sqlite3"))
+    os.environ.setdefault("RELAY_PATH", os.path.join(workdir, "relay.sqlite3"))
+    os.environ.setdefault("ASSET_CACHE_DIR", os.path.join(workdir, "asset_cache"))
+    os.environ.setdefault("MANAGER_ID", "1")
+    os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "100000")
+    os.environ.setdefault("OUTBOUND_CHAT_RATE", "100000")
+    os.environ.setdefault("THROTTLE_RATE", "0")
+    from aiogram import Bot
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import SendMediaGroup, TelegramMethod
+    from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+    import Homebot
+    import T_bot
+    from assets import asset_pipeline
+    from message_edits import debounced_edits
+    from outbound import manager_digest
+
+    ids = itertools.count(1)
+
+    def message(chat_id: int, text: Optional[str] = None) -> Message:
+        return Message(
+            message_id=next(ids), date=datetime.datetime.now(), chat=Chat(id=chat_id, type="private"), text=text
+        )
+
+    class InstantSession(BaseSession):
+        """Answers every Bot API call at once, so only the bot's own work is timed."""
+
+        async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+            chat_id = int(getattr(method, "chat_id", None) or 0)
+            if isinstance(method, SendMediaGroup):
+                return [message(chat_id) for _ in method.media]
+            if method.__returning__ is bool:
+                return True
+            return message(chat_id)
+
+        async def stream_content(self, *args: Any, **kwargs: Any):
+            yield b""
+
+        async def close(self) -> None:
+            pass
+
+    def updates(flow, users: range) -> List[Update]:
+        result = []
+        for user_id in users:
+            user = User(id=user_id, is_bot=False, first_name="Bench")
+            picker = message(user_id)
+            # The flow, then a message outside any flow and a /cancel with nothing to cancel.
+            for text, is_callback, _ in [*flow, ("Здравствуйте", False, ()), ("/cancel", False, ())]:
+                if is_callback:
+                    event = CallbackQuery(
+                        id=str(next(ids)), chat_instance="bench", from_user=user, data=text, message=picker
+                    )
+                    result.append(Update(update_id=next(ids), callback_query=event))
+                else:
+                    event = Message(
+                        message_id=next(ids),
+                        date=datetime.datetime.now(),
+                        chat=Chat(id=user_id, type="private"),
+                        from_user=user,
+                        text=text,
+                    )
+                    result.append(Update(update_id=next(ids), message=event))
+        return result
+
+    session = InstantSession()
+    await asset_pipeline.prepare(path for path, _ in T_bot.STYLE_PHOTOS)
+    bots = [
+        ("order", T_bot, Bot("100001:BENCH", session=session), ORDER_FLOW),
+        ("calculate", Homebot, Bot("100002:BENCH", session=session), CALCULATE_FLOW),
+    ]
+    for name, module, bot, flow in bots:
+        dp = module.create_dispatcher()
+        batch = updates(flow, range(100_000, 100_000 + args.users))
+        started = time.perf_counter()
+        for update in batch:
+            await dp.feed_update(bot, update)
+        elapsed = time.perf_counter() - started
+        print(f"{name}: {len(batch)} updates in {elapsed:.2f}s, {len(batch) / elapsed:.0f} updates/s")
+    await debounced_edits.close()
+    await manager_digest.close()
+    await asset_pipeline.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Updates per second through each bot's dispatcher, with no network.")
+    parser.add_argument("--users", type=int, default=1000, help="simulated users, each going through the whole flow")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
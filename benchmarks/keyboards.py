@@ -0,0 +1,42 @@
+import argparse
+import sys
+import timeit
+
+import keyboards
+from benchmarks import legacy
+from pricing import pricing_file
+
+
+def per_call(func, number: int) -> float:
+    return timeit.timeit(func, number=number) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Keyboard cost per update: built on every answer against prebuilt.")
+    parser.add_argument("--number", type=int, default=20_000, help="keyboards per measurement")
+    args = parser.parse_args()
+    total_built = total_prebuilt = 0.0
+    for name, build in legacy.KEYBOARDS.items():
+        keyboard = getattr(keyboards, name)
+        built = per_call(build, args.number)
+        prebuilt = per_call(lambda: keyboard.markup, args.number)
+        total_built += built
+        total_prebuilt += prebuilt
+        print(f"{name}: built {built:.1f}us, prebuilt {prebuilt:.3f}us")
+    print(f"all of the above: built {total_built:.1f}us, prebuilt {total_prebuilt:.3f}us")
+
+    choices = pricing_file.get().choices
+    selected = frozenset(["area_check", "bank_evaluation"])
+    old_picker = per_call(legacy.services_keyboards, args.number // 10)
+    uncached = per_call(
+        lambda: keyboards.services_keyboard.__wrapped__(choices, selected, "calculate"), args.number // 10
+    )
+    cached = per_call(lambda: keyboards.services_keyboard(choices, selected, "calculate"), args.number)
+    print(
+        f"service picker: ten keyboards per answer {old_picker:.1f}us, "
+        f"one keyboard {uncached:.1f}us, memoised {cached:.2f}us"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
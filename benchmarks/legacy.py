@@ -0,0 +1,107 @@
+# Code paths as they were before their optimised replacements; the benchmarks
+# and equivalence tests compare against them.
+from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton, ReplyKeyboardBuilder
+
+
+def calculations(house_area, rooms_number, services) -> int:
+    services_cost = house_area * 80
+    for service in services:
+        if service == 'Проверка площади ✅':
+            if rooms_number == 'Студия':
+                services_cost += 200
+            elif rooms_number == '1':
+                services_cost += 300
+            elif rooms_number == '2':
+                services_cost += 400
+            elif rooms_number == '3':
+                services_cost += 500
+            else:
+                services_cost += 600
+        elif service == 'Оценка для банка ✅':
+            services_cost += 3500
+        elif service == 'Тепловизионный осмотр ✅':
+            if rooms_number == 'Студия':
+                services_cost += 1000
+            elif rooms_number == '1':
+                services_cost += 1500
+            elif rooms_number == '2':
+                services_cost += 2000
+            elif rooms_number == '3':
+                services_cost += 2500
+            else:
+                services_cost += 3000
+        elif service == 'План квартиры в AutoCAD ✅':
+            if rooms_number == 'Студия':
+                services_cost += 2500
+            elif rooms_number == '1':
+                services_cost += 3000
+            elif rooms_number == '2':
+                services_cost += 3500
+            elif rooms_number == '3':
+                services_cost += 4000
+            else:
+                services_cost += 5000
+        elif service == 'Замер радиации ✅':
+            services_cost += 500
+        elif service == 'Тепловизионный отчет ✅':
+            services_cost += 1500
+        elif service == 'Выезд специалиста НОПРИЗ или НОСТРОЙ ✅':
+            services_cost += 40 * house_area
+    return services_cost
+
+
+def _reply_markup(*rows) -> ReplyKeyboardMarkup:
+    builder = ReplyKeyboardBuilder()
+    for row in rows:
+        builder.row(*(KeyboardButton(text=text) for text in row))
+    return builder.as_markup(resize_keyboard=True)
+
+
+# Each answer used to build the next question's keyboard from scratch; keys
+# are the names of the prebuilt keyboards in keyboards.py.
+KEYBOARDS = {
+    "OVERHAULS_PLACE": lambda: _reply_markup(["в новостройке"], ["во вторичном жилье"], ["в доме"]),
+    "INTERIOR_STYLE": lambda: _reply_markup(
+        ["классический", "лофт"],
+        ["минимализм", "неоклассика"],
+        ["современная классика"],
+        ["современный стиль"],
+        ["хайтек"],
+    ),
+    "DESIGN_PROJECT": lambda: _reply_markup(["Да", "Нет"], ["Пока думаю"]),
+    "OVERHAULS_DATE": lambda: _reply_markup(
+        ["в течение 2-х недель"], ["в течение этого месяца"], ["в следующем месяце"], ["другое"]
+    ),
+    "YOUR_LOCATION": lambda: _reply_markup(["в Набережных Челнах"], ["в другом городе"], ["другое"]),
+    "HOW_TO_TELL": lambda: _reply_markup(["по WhatsApp", "в Telegram"], ["по телефону"]),
+    "CONFIRM_ORDER": lambda: _reply_markup(["✅ да", "❌ нет"]),
+    "ROOMS_NUMBER": lambda: _reply_markup(["1", "2"], ["3", "4"], ["Студия"]),
+}
+
+
+# Answering the rooms question used to build nine one-button service
+# keyboards and a "продолжить" keyboard.
+SERVICES = (
+    ("Проверка площади ❌", "area_check"),
+    ("Оценка для банка ❌", "bank_evaluation"),
+    ("Тепловизионный осмотр ❌", "thermal_imaging_inspection"),
+    ("План квартиры в AutoCAD ❌", "apartment_plan"),
+    ("Экспертиза ремонта ❌", "repair_examination"),
+    ("Юридическое взыскание ❌", "legal_penalty"),
+    ("Замер радиации ❌", "radiation_measurement"),
+    ("Тепловизионный отчет ❌", "thermal_imaging_report"),
+    ("Выезд специалиста НОПРИЗ или НОСТРОЙ ❌", "specialist_visit"),
+)
+
+
+def buttons(button_text, button_callback_data):
+    keyboard = InlineKeyboardBuilder()
+    keyboard.row(InlineKeyboardButton(text=button_text, callback_data=button_callback_data))
+    return keyboard
+
+
+def services_keyboards():
+    markups = [buttons(text, callback_data).as_markup() for text, callback_data in SERVICES]
+    markups.append(_reply_markup(["продолжить"]))
+    return markups
@@ -0,0 +1,32 @@
+import argparse
+import sys
+import timeit
+
+from benchmarks import legacy
+from pricing import pricing_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time a Homebot quote: the old if/elif chain against the price table.")
+    parser.add_argument("--number", type=int, default=200_000, help="quotes per measurement")
+    args = parser.parse_args()
+    pricing = pricing_file.get()
+    labels = {service_id: f"{service.label} ✅" for service_id, service in pricing.services.items()}
+    selections = {
+        "no services": [],
+        "three services": ["area_check", "bank_evaluation", "specialist_visit"],
+        "all services": list(pricing.services),
+    }
+    for name, service_ids in selections.items():
+        chosen = [labels[service_id] for service_id in service_ids]
+        chain = timeit.timeit(lambda: legacy.calculations(54, "2", chosen), number=args.number)
+        table = timeit.timeit(lambda: pricing.quote(54, "2", service_ids), number=args.number)
+        reloading = timeit.timeit(lambda: pricing_file.get().quote(54, "2", service_ids), number=args.number)
+        print(
+            f"{name}: if/elif {chain / args.number * 1e6:.2f}us, table {table / args.number * 1e6:.2f}us, "
+            f"table with reload check {reloading / args.number * 1e6:.2f}us"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
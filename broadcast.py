@@ -0,0 +1,202 @@
+import asyncio
+import datetime
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import suppress
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+import config
+from outbound import OutboundQueue
+
+# Filter names accepted by /broadcast and the OrderStore.segment argument each sets.
+SEGMENT_FILTERS = {"from": "start", "to": "end", "style": "style", "city": "city"}
+
+
+def parse_segment(text: str) -> Dict[str, object]:
+    """Parses ``/broadcast from=2024-01-01; to=2024-02-01; style=лофт; city=Челны``.
+
+    Raises ValueError for anything that is not a known ``name=value`` filter,
+    so a typo never widens the segment to every client.
+    """
+    if text.startswith("/"):
+        text = text.partition(" ")[2]
+    segment: Dict[str, object] = {}
+    for argument in filter(None, (part.strip() for part in text.split(";"))):
+        name, separator, value = (part.strip() for part in argument.partition("="))
+        if not separator or name not in SEGMENT_FILTERS or not value:
+            raise ValueError(f"непонятное условие «{argument}»")
+        key = SEGMENT_FILTERS[name]
+        if key in segment:
+            raise ValueError(f"условие {name} указано дважды")
+        if name in ("from", "to"):
+            try:
+                segment[key] = datetime.date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"дата «{value}» не в формате ГГГГ-ММ-ДД") from None
+        else:
+            segment[key] = value
+    return segment
+
+
+class BroadcastLog:
+    """Broadcasts and their per-recipient delivery status, kept in SQLite."""
+
+    def __init__(self, path: str = config.ORDER_STORE_PATH) -> None:
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS broadcasts ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " from_chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL,"
+                " status_message_id INTEGER,"
+                " created_at TEXT NOT NULL, finished_at TEXT)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS deliveries ("
+                " broadcast_id INTEGER NOT NULL, chat_id INTEGER NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'pending', error TEXT,"
+                " PRIMARY KEY (broadcast_id, chat_id))"
+            )
+
+    def create(
+        self, from_chat_id: int, message_id: int, status_message_id: int, recipients: List[int]
+    ) -> int:
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO broadcasts (from_chat_id, message_id, status_message_id, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                (from_chat_id, message_id, status_message_id, datetime.datetime.now().isoformat()),
+            )
+            broadcast_id = cursor.lastrowid
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO deliveries (broadcast_id, chat_id) VALUES (?, ?)",
+                [(broadcast_id, chat_id) for chat_id in recipients],
+            )
+        return broadcast_id
+
+    def get(self, broadcast_id: int) -> Tuple[int, int, int]:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT from_chat_id, message_id, status_message_id FROM broadcasts WHERE id = ?",
+                (broadcast_id,),
+            ).fetchone()
+
+    def unfinished(self) -> List[int]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id FROM broadcasts WHERE finished_at IS NULL"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def pending(self, broadcast_id: int) -> List[int]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT chat_id FROM deliveries WHERE broadcast_id = ? AND status = 'pending'",
+                (broadcast_id,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def counts(self, broadcast_id: int) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT status, COUNT(*) FROM deliveries WHERE broadcast_id = ? GROUP BY status",
+                (broadcast_id,),
+            ).fetchall()
+        return dict(rows)
+
+    def record(self, broadcast_id: int, results: List[Tuple[int, str, Optional[str]]]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE deliveries SET status = ?, error = ? WHERE broadcast_id = ? AND chat_id = ?",
+                [(status, error, broadcast_id, chat_id) for chat_id, status, error in results],
+            )
+
+    def finish(self, broadcast_id: int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE broadcasts SET finished_at = ? WHERE id = ?",
+                (datetime.datetime.now().isoformat(), broadcast_id),
+            )
+
+
+class Broadcaster:
+    """Copies one message to many clients within the outbound rate limits.
+
+    Each result is written to the log as soon as its send returns, so after a
+    crash ``resume`` only sends to recipients that were still pending. The
+    one duplicate window left is a send Telegram accepted just before the
+    crash, so at most ``concurrency`` clients can get the message twice.
+    """
+
+    def __init__(
+        self,
+        log: BroadcastLog,
+        queue: OutboundQueue,
+        concurrency: int = 30,
+        progress_interval: float = 5.0,
+    ) -> None:
+        self.log = log
+        self.queue = queue
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def start(self, bot: Bot, broadcast_id: int) -> None:
+        if broadcast_id not in self._tasks:
+            task = asyncio.create_task(self._run(bot, broadcast_id))
+            self._tasks[broadcast_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def resume(self, bot: Bot) -> None:
+        for broadcast_id in await asyncio.to_thread(self.log.unfinished):
+            logging.info("Resuming broadcast %d", broadcast_id)
+            self.start(bot, broadcast_id)
+
+    async def _send(self, bot: Bot, chat_id: int, from_chat_id: int, message_id: int) -> Tuple[int, str, Optional[str]]:
+        try:
+            await self.queue.send(
+                chat_id,
+                lambda: bot.copy_message(
+                    chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id
+                ),
+            )
+        except TelegramAPIError as error:
+            return chat_id, "failed", str(error)
+        return chat_id, "sent", None
+
+    async def _report(self, bot: Bot, broadcast_id: int, from_chat_id: int, status_message_id: int) -> None:
+        counts = await asyncio.to_thread(self.log.counts, broadcast_id)
+        text = (
+            f"Рассылка #{broadcast_id}: отправлено {counts.get('sent', 0)}, "
+            f"ошибок {counts.get('failed', 0)}, осталось {counts.get('pending', 0)}"
+        )
+        with suppress(TelegramAPIError):
+            await bot.edit_message_text(text=text, chat_id=from_chat_id, message_id=status_message_id)
+
+    async def _run(self, bot: Bot, broadcast_id: int) -> None:
+        from_chat_id, message_id, status_message_id = await asyncio.to_thread(self.log.get, broadcast_id)
+        pending = await asyncio.to_thread(self.log.pending, broadcast_id)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        reported_at = time.monotonic()
+
+        async def deliver(chat_id: int) -> None:
+            nonlocal reported_at
+            async with semaphore:
+                result = await self._send(bot, chat_id, from_chat_id, message_id)
+                # Recorded before the slot is freed: a sent message must be in
+                # the log before the next one goes out.
+                await asyncio.to_thread(self.log.record, broadcast_id, [result])
+            if time.monotonic() - reported_at >= self.progress_interval:
+                reported_at = time.monotonic()
+                await self._report(bot, broadcast_id, from_chat_id, status_message_id)
+
+        await asyncio.gather(*(deliver(chat_id) for chat_id in pending))
+        await asyncio.to_thread(self.log.finish, broadcast_id)
+        await self._report(bot, broadcast_id, from_chat_id, status_message_id)
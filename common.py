@@ -0,0 +1,76 @@
+import logging
+from typing import Optional
+
+from aiogram.exceptions import TelegramAPIError
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message
+from aiogram.utils.markdown import hbold
+
+import config
+import keyboards
+from dispatch_index import DispatchIndex
+from outbound import outbound
+from relay import RelayMap
+
+
+def register_common_handlers(
+    index: DispatchIndex, menu_hint: str, greeting: str = "", relay: Optional[RelayMap] = None
+) -> None:
+    """Registers /start, cancel and the catch-all reply shared by every bot.
+
+    With a ``relay``, messages that belong to no flow are forwarded to the
+    manager, and the manager's replies to them are copied back to the client.
+    """
+
+    @index.command("start")
+    async def command_start_handler(message: Message) -> None:
+        await message.answer(
+            f"Привет {hbold(message.from_user.full_name)}!\nЯ Чат-бот!\n"
+            f"{greeting or menu_hint}",
+            reply_markup=keyboards.REMOVE,
+        )
+
+    @index.command("cancel")
+    @index.text("cancel")
+    async def cancel_handler(message: Message, state: FSMContext) -> None:
+        current_state = await state.get_state()
+        if current_state is None:
+            return
+        logging.info("Cancelling state %r", current_state)
+        await state.clear()
+        await message.answer(
+            "Отменено",
+            reply_markup=keyboards.REMOVE,
+        )
+
+    @index.default
+    async def message_answer(message: Message) -> None:
+        if relay is None or message.chat.id == config.MANAGER_ID:
+            await message.reply(menu_hint)
+            return
+        try:
+            forwarded = await outbound.send(
+                config.MANAGER_ID, lambda: message.forward(config.MANAGER_ID)
+            )
+        except TelegramAPIError as error:
+            logging.warning("Forwarding a client message to the manager failed: %s", error)
+            await message.reply(menu_hint)
+            return
+        await relay.remember(message.bot.id, forwarded.message_id, message.chat.id)
+        await message.reply(f"Сообщение передано менеджеру, ответ придет в этот чат.\n{menu_hint}")
+
+    if relay is None:
+        return
+
+    @index.message(
+        lambda message: message.chat.id == config.MANAGER_ID and message.reply_to_message is not None
+    )
+    async def reply_to_client(message: Message) -> None:
+        client_chat_id = await relay.client_for(message.bot.id, message.reply_to_message.message_id)
+        if client_chat_id is None:
+            await message.reply(
+                "Не удалось определить клиента: ответьте на пересланное ботом сообщение клиента."
+            )
+            return
+        await outbound.send(client_chat_id, lambda: message.copy_to(client_chat_id))
+        await message.reply("Ответ отправлен клиенту.")
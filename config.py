@@ -0,0 +1,73 @@
+import os
+
+MANAGER_ID = int(os.getenv("MANAGER_ID", "6704840056"))
+
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", "media_cache.json")
+# Chat used to pre-upload the style gallery at startup; warm-up is skipped when unset.
+MEDIA_CACHE_CHAT_ID = int(os.getenv("MEDIA_CACHE_CHAT_ID", "0")) or None
+# Style gallery photos are sent as copies scaled to GALLERY_MAX_SIDE pixels,
+# rendered once into ASSET_CACHE_DIR (needs Pillow, otherwise originals are sent).
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", "asset_cache")
+GALLERY_MAX_SIDE = int(os.getenv("GALLERY_MAX_SIDE", "1280"))
+GALLERY_JPEG_QUALITY = int(os.getenv("GALLERY_JPEG_QUALITY", "82"))
+
+# "memory", "sqlite:///path/to/fsm.sqlite3" or "redis://host:port/db".
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+# Seconds of inactivity after which a half-finished conversation is dropped.
+FSM_TTL = int(os.getenv("FSM_TTL", str(7 * 24 * 3600))) or None
+
+# "polling" or "webhook".
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+# Required in webhook mode; Telegram sends it with every update.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+ORDER_STORE_PATH = os.getenv("ORDER_STORE_PATH", "orders.sqlite3")
+# Checkpoint of the /stats counts, so each report only reads orders added since.
+STATS_PATH = os.getenv("STATS_PATH", "order_stats.json")
+
+# Bot API calls per second across all chats and per single chat.
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+# Seconds to collect new orders into one manager document; 0 sends each order at once.
+MANAGER_DIGEST_WINDOW = float(os.getenv("MANAGER_DIGEST_WINDOW", "0"))
+# Seconds to collect rapid taps on an inline keyboard into one message edit.
+EDIT_DEBOUNCE = float(os.getenv("EDIT_DEBOUNCE", "0.3"))
+
+# Background jobs: client reminders, manager follow-ups and FSM cleanup.
+SCHEDULER_PATH = os.getenv("SCHEDULER_PATH", "jobs.sqlite3")
+# Seconds before a client who stopped halfway through /order or /calculate is
+# reminded, and before the manager is reminded about a new order; 0 disables.
+REMINDER_DELAY = float(os.getenv("REMINDER_DELAY", "3600"))
+ORDER_FOLLOWUP_DELAY = float(os.getenv("ORDER_FOLLOWUP_DELAY", str(24 * 3600)))
+# Seconds between sweeps of expired conversations out of memory or SQLite FSM
+# storage; Redis expires them by itself.
+FSM_PURGE_INTERVAL = float(os.getenv("FSM_PURGE_INTERVAL", "600"))
+
+# Client messages forwarded to the manager and who they came from, so that
+# replies can be routed back; entries expire after RELAY_TTL seconds.
+RELAY_PATH = os.getenv("RELAY_PATH", "relay.sqlite3")
+RELAY_TTL = float(os.getenv("RELAY_TTL", str(7 * 24 * 3600)))
+
+PRICING_PATH = os.getenv("PRICING_PATH", "pricing.json")
+
+# Bots started by runner.py, as "module:bot_attribute" pairs.
+BOTS = [
+    spec.strip()
+    for spec in os.getenv("BOTS", "T_bot:bot,Homebot:bot2").split(",")
+    if spec.strip()
+]
+
+# Serves Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics; 0 disables.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Requests per second and burst allowed per user for handlers without their
+# own limit; a rate of 0 leaves them unthrottled.
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "2"))
+THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "5"))
+
+# Seconds during which a repeated update or order confirmation is ignored.
+DEDUP_TTL = int(os.getenv("DEDUP_TTL", str(24 * 3600)))
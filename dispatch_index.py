@@ -0,0 +1,152 @@
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.fsm.state import State
+from aiogram.types import CallbackQuery, Message
+
+import metrics
+
+Handler = Callable[..., Any]
+StateLike = Union[State, str, None]
+
+
+def _state_name(state: StateLike) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def _handler_name(handler: CallableObject) -> str:
+    return f"{handler.callback.__module__}.{handler.callback.__name__}"
+
+
+class DispatchIndex:
+    """Resolves message and callback handlers with dict lookups.
+
+    One aiogram handler per update type is registered on the router; it
+    looks the update up in this order:
+
+    * messages: command name, exact text, (state, text), state, filters, fallback;
+    * callback queries: (state, data), data, filters.
+
+    Filters are plain predicates called only when no table matches.
+    Texts are compared case-insensitively.
+    """
+
+    def __init__(self) -> None:
+        self.commands: Dict[str, CallableObject] = {}
+        self.texts: Dict[str, CallableObject] = {}
+        self.state_texts: Dict[Tuple[Optional[str], str], CallableObject] = {}
+        self.states: Dict[Optional[str], CallableObject] = {}
+        self.message_filters: List[Tuple[CallableObject, CallableObject]] = []
+        self.fallback: Optional[CallableObject] = None
+        self.callbacks: Dict[str, CallableObject] = {}
+        self.state_callbacks: Dict[Tuple[Optional[str], str], CallableObject] = {}
+        self.callback_filters: List[Tuple[CallableObject, CallableObject]] = []
+
+    def command(self, *names: str) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            for name in names:
+                self.commands[name.lower()] = CallableObject(handler)
+            return handler
+
+        return register
+
+    def text(self, *texts: str, state: StateLike = ...) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            for text in texts:
+                if state is ...:
+                    self.texts[text.casefold()] = CallableObject(handler)
+                else:
+                    self.state_texts[(_state_name(state), text.casefold())] = CallableObject(handler)
+            return handler
+
+        return register
+
+    def state(self, *states: StateLike) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            for state in states:
+                self.states[_state_name(state)] = CallableObject(handler)
+            return handler
+
+        return register
+
+    def message(self, predicate: Callable[..., Any]) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            self.message_filters.append((CallableObject(predicate), CallableObject(handler)))
+            return handler
+
+        return register
+
+    def default(self, handler: Handler) -> Handler:
+        self.fallback = CallableObject(handler)
+        return handler
+
+    def callback(self, *data: str, state: StateLike = ...) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            for value in data:
+                if state is ...:
+                    self.callbacks[value] = CallableObject(handler)
+                else:
+                    self.state_callbacks[(_state_name(state), value)] = CallableObject(handler)
+            return handler
+
+        return register
+
+    def callback_query(self, predicate: Callable[..., Any]) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            self.callback_filters.append((CallableObject(predicate), CallableObject(handler)))
+            return handler
+
+        return register
+
+    @staticmethod
+    async def _first_match(
+        candidates: List[Tuple[CallableObject, CallableObject]], event: Any, kwargs: Dict[str, Any]
+    ) -> Optional[CallableObject]:
+        for predicate, handler in candidates:
+            if await predicate.call(event, **kwargs):
+                return handler
+        return None
+
+    async def resolve_message(self, message: Message, kwargs: Dict[str, Any]) -> Optional[CallableObject]:
+        text = message.text
+        raw_state = kwargs.get("raw_state")
+        if text:
+            if text.startswith("/"):
+                name = text[1:].split(maxsplit=1)[0].partition("@")[0].lower() if len(text) > 1 else ""
+                handler = self.commands.get(name)
+                if handler is not None:
+                    return handler
+            key = text.casefold()
+            handler = self.texts.get(key) or self.state_texts.get((raw_state, key))
+            if handler is not None:
+                return handler
+        handler = self.states.get(raw_state)
+        if handler is not None:
+            return handler
+        return await self._first_match(self.message_filters, message, kwargs) or self.fallback
+
+    async def resolve_callback(self, query: CallbackQuery, kwargs: Dict[str, Any]) -> Optional[CallableObject]:
+        data = query.data or ""
+        handler = self.state_callbacks.get((kwargs.get("raw_state"), data)) or self.callbacks.get(data)
+        if handler is not None:
+            return handler
+        return await self._first_match(self.callback_filters, query, kwargs)
+
+    async def _dispatch_message(self, message: Message, **kwargs: Any) -> Any:
+        handler = await self.resolve_message(message, kwargs)
+        if handler is None:
+            return UNHANDLED
+        return await metrics.timed(_handler_name(handler), partial(handler.call, message, **kwargs))
+
+    async def _dispatch_callback(self, query: CallbackQuery, **kwargs: Any) -> Any:
+        handler = await self.resolve_callback(query, kwargs)
+        if handler is None:
+            return UNHANDLED
+        return await metrics.timed(_handler_name(handler), partial(handler.call, query, **kwargs))
+
+    def attach(self, router: Router) -> None:
+        router.message()(self._dispatch_message)
+        router.callback_query()(self._dispatch_callback)
@@ -0,0 +1,105 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.types import TelegramObject, Update
+
+import config
+from storage import SQLiteStorage
+
+
+class TTLSet:
+    """Bounded set of recently seen keys; the oldest keys are evicted first."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._expires: "OrderedDict[str, float]" = OrderedDict()
+
+    def add(self, key: str) -> bool:
+        """Adds ``key`` and returns False if it was already present."""
+        now = time.monotonic()
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at > now:
+            return False
+        self._expires[key] = now + self.ttl
+        self._expires.move_to_end(key)
+        while self._expires:
+            oldest, expires_at = next(iter(self._expires.items()))
+            if expires_at > now and len(self._expires) <= self.maxsize:
+                break
+            del self._expires[oldest]
+        return True
+
+    def discard(self, key: str) -> None:
+        self._expires.pop(key, None)
+
+
+class Deduplicator:
+    """Claims keys exactly once, per process and, when possible, across workers.
+
+    The in-memory set catches most repeats cheaply. SQLite and Redis storages
+    also record the claim, so another worker sharing the storage sees it.
+    """
+
+    def __init__(self, storage: Optional[BaseStorage] = None, ttl: int = config.DEDUP_TTL, maxsize: int = 100_000) -> None:
+        self.ttl = ttl
+        self.local = TTLSet(maxsize, ttl)
+        self._claim_shared: Optional[Callable[[str], Awaitable[bool]]] = None
+        self._release_shared: Optional[Callable[[str], Awaitable[Any]]] = None
+        if isinstance(storage, SQLiteStorage):
+            self._claim_shared = lambda key: storage.claim(key, ttl)
+            self._release_shared = storage.release
+        elif hasattr(storage, "redis"):
+            redis = storage.redis
+
+            async def claim_in_redis(key: str) -> bool:
+                return bool(await redis.set(f"dedup:{key}", 1, nx=True, ex=ttl))
+
+            self._claim_shared = claim_in_redis
+            self._release_shared = lambda key: redis.delete(f"dedup:{key}")
+
+    async def claim(self, key: str) -> bool:
+        if not self.local.add(key):
+            return False
+        if self._claim_shared is not None:
+            return await self._claim_shared(key)
+        return True
+
+    async def release(self, key: str) -> None:
+        """Gives up a claim whose work failed, so a retry can claim it again."""
+        self.local.discard(key)
+        if self._release_shared is not None:
+            await self._release_shared(key)
+
+
+class DeduplicationMiddleware(BaseMiddleware):
+    """Drops updates that were already processed, e.g. redelivered after a restart."""
+
+    def __init__(self, deduplicator: Deduplicator) -> None:
+        self.deduplicator = deduplicator
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = f"update:{data['bot'].id}:{event.update_id}"
+        if event.callback_query is not None:
+            key = f"callback:{event.callback_query.id}"
+        if not await self.deduplicator.claim(key):
+            logging.info("Skipping duplicate %s", key)
+            return None
+        return await handler(event, data)
+
+
+def setup(dp: Dispatcher) -> Deduplicator:
+    """Installs the middleware and exposes the deduplicator to handlers as ``dedup``."""
+    deduplicator = Deduplicator(dp.storage)
+    dp.update.outer_middleware(DeduplicationMiddleware(deduplicator))
+    dp["dedup"] = deduplicator
+    return deduplicator
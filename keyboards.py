@@ -0,0 +1,106 @@
+from functools import lru_cache
+from typing import FrozenSet, NamedTuple, Sequence
+
+from aiogram.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
+)
+
+
+class Keyboard(NamedTuple):
+    options: FrozenSet[str]
+    markup: ReplyKeyboardMarkup
+
+
+def reply_keyboard(*rows: Sequence[str], one_time: bool = False) -> Keyboard:
+    # Markups are built once and shared by every chat, so they must never be mutated.
+    return Keyboard(
+        options=frozenset(text for row in rows for text in row),
+        markup=ReplyKeyboardMarkup(
+            keyboard=[[KeyboardButton(text=text) for text in row] for row in rows],
+            resize_keyboard=True,
+            one_time_keyboard=one_time or None,
+        ),
+    )
+
+
+REMOVE = ReplyKeyboardRemove()
+
+# T_bot /order
+OVERHAULS_PLACE = reply_keyboard(
+    ["в новостройке"],
+    ["во вторичном жилье"],
+    ["в доме"],
+)
+INTERIOR_STYLE = reply_keyboard(
+    ["классический", "лофт"],
+    ["минимализм", "неоклассика"],
+    ["современная классика"],
+    ["современный стиль"],
+    ["хайтек"],
+)
+DESIGN_PROJECT = reply_keyboard(
+    ["Да", "Нет"],
+    ["Пока думаю"],
+)
+OVERHAULS_DATE = reply_keyboard(
+    ["в течение 2-х недель"],
+    ["в течение этого месяца"],
+    ["в следующем месяце"],
+    ["другое"],
+)
+YOUR_LOCATION = reply_keyboard(
+    ["в Набережных Челнах"],
+    ["в другом городе"],
+    ["другое"],
+)
+HOW_TO_TELL = reply_keyboard(
+    ["по WhatsApp", "в Telegram"],
+    ["по телефону"],
+)
+CONFIRM_ORDER = reply_keyboard(["✅ да", "❌ нет"])
+CONFIRM_BROADCAST = reply_keyboard(["✅ отправить", "❌ отмена"])
+LINKS = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text="Участвуй в STandARTup проекте", url="https://housedecor.pro/start"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                text="Перейти на сайт HouseDecor", url="https://housedecor.pro/"
+            )
+        ],
+    ]
+)
+
+# Homebot /calculate
+ROOMS_NUMBER = reply_keyboard(
+    ["1", "2"],
+    ["3", "4"],
+    ["Студия"],
+    one_time=True,
+)
+
+
+@lru_cache(maxsize=1024)
+def services_keyboard(
+    services: Sequence[Sequence[str]], selected: FrozenSet[str], done_callback: str
+) -> InlineKeyboardMarkup:
+    """Homebot's service picker; ``services`` holds ``(callback id, label)`` pairs."""
+    rows = [
+        [
+            InlineKeyboardButton(
+                text=f"{label} {'✅' if service_id in selected else '❌'}",
+                callback_data=service_id,
+            )
+        ]
+        for service_id, label in services
+    ]
+    rows.append([InlineKeyboardButton(text="продолжить", callback_data=done_callback)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
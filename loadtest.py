@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+# (text or callback data, is_callback, Bot API methods that complete the reply)
+Step = Tuple[str, bool, Sequence[str]]
+
+ORDER_FLOW: List[Step] = [
+    ("/order", False, ["sendMessage", "sendMessage"]),
+    ("в доме", False, ["sendMessage"]),
+    ("120", False, ["sendMediaGroup", "sendMessage"]),
+    ("лофт", False, ["sendMessage"]),
+    ("Да", False, ["sendMessage"]),
+    ("другое", False, ["sendMessage"]),
+    ("ул. Мира, 1", False, ["sendMessage"]),
+    ("в другом городе", False, ["sendMessage"]),
+    ("в Telegram", False, ["sendMessage"]),
+    ("89991234567", False, ["sendMessage"]),
+    ("✅ да", False, ["sendMessage"]),
+]
+CALCULATE_FLOW: List[Step] = [
+    ("/calculate", False, ["sendMessage"]),
+    ("54", False, ["sendMessage"]),
+    ("2", False, ["sendMessage"]),
+    ("area_check", True, ["answerCallbackQuery"]),
+    ("bank_evaluation", True, ["answerCallbackQuery"]),
+    ("calculate", True, ["answerCallbackQuery", "editMessageReplyMarkup"] + ["sendMessage"] * 3),
+]
+
+BOT_TOKENS = {"order": "100001:LOADTEST", "calculate": "100002:LOADTEST"}
+
+
+class FakeTelegram:
+    """Stub Bot API server: queues updates for getUpdates and answers sends.
+
+    Every reply addressed to a chat is delivered to that chat's inbox so the
+    virtual users can time it. ``latency`` delays every call and ``flood_rate``
+    is the share of send calls answered with a 429.
+    """
+
+    def __init__(self, latency: float = 0.0, flood_rate: float = 0.0) -> None:
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.updates: Dict[str, asyncio.Queue] = collections.defaultdict(asyncio.Queue)
+        self.inboxes: Dict[int, asyncio.Queue] = collections.defaultdict(asyncio.Queue)
+        self.callback_chats: Dict[str, int] = {}
+        # Inline buttons belong to the last message the bot sent to the chat.
+        self.last_messages: Dict[int, int] = {}
+        self.calls: collections.Counter = collections.Counter()
+        self.floods = 0
+        self._message_ids = itertools.count(1)
+
+    def _message(self, chat_id: int, **extra: Any) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **extra,
+        }
+
+    async def _get_updates(self, token: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        queue = self.updates[token]
+        try:
+            first = await asyncio.wait_for(queue.get(), timeout=float(params.get("timeout", 0)) or 0.01)
+        except asyncio.TimeoutError:
+            return []
+        updates = [first]
+        while not queue.empty() and len(updates) < 100:
+            updates.append(queue.get_nowait())
+        return updates
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token, method = request.match_info["token"], request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(token, params)})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.startswith(("send", "edit", "forward", "copy")) and random.random() < self.flood_rate:
+            self.floods += 1
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }
+            )
+        chat_id = int(params["chat_id"]) if "chat_id" in params else self.callback_chats.pop(
+            params.get("callback_query_id", ""), None
+        )
+        if method == "getMe":
+            result: Any = {"id": int(token.split(":")[0]), "is_bot": True, "first_name": "Load"}
+        elif method == "sendMediaGroup":
+            photo = [{"file_id": "stub", "file_unique_id": "stub", "width": 1, "height": 1}]
+            result = [self._message(chat_id, photo=photo) for _ in range(7)]
+        elif method.startswith(("send", "edit", "forward")):
+            result = self._message(chat_id, text=params.get("text", ""))
+            if method == "sendMessage":
+                self.last_messages[chat_id] = result["message_id"]
+        elif method == "copyMessage":
+            result = {"message_id": next(self._message_ids)}
+        else:
+            result = True
+        if chat_id is not None:
+            self.inboxes[chat_id].put_nowait((method, time.perf_counter()))
+        return web.json_response({"ok": True, "result": result})
+
+    def push(self, token: str, chat_id: int, step: Step, update_id: int) -> None:
+        value, is_callback, _ = step
+        user = {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}"}
+        message = self._message(chat_id, **({} if is_callback else {"from": user, "text": value}))
+        if is_callback:
+            message["message_id"] = self.last_messages.get(chat_id, message["message_id"])
+            query_id = f"{chat_id}-{update_id}"
+            self.callback_chats[query_id] = chat_id
+            update = {
+                "update_id": update_id,
+                "callback_query": {
+                    "id": query_id,
+                    "from": user,
+                    "chat_instance": str(chat_id),
+                    "message": message,
+                    "data": value,
+                },
+            }
+        else:
+            update = {"update_id": update_id, "message": message}
+        self.updates[token].put_nowait(update)
+
+
+class VirtualUsers:
+    def __init__(self, server: FakeTelegram, timeout: float) -> None:
+        self.server = server
+        self.timeout = timeout
+        self.latencies: Dict[str, List[float]] = collections.defaultdict(list)
+        self.timeouts = 0
+        self.completed = 0
+        self.updates_sent = 0
+        self._update_ids = itertools.count(1)
+
+    async def _step(self, flow: str, chat_id: int, step: Step) -> None:
+        inbox = self.server.inboxes[chat_id]
+        expected = collections.Counter(step[2])
+        started = time.perf_counter()
+        self.server.push(BOT_TOKENS[flow], chat_id, step, next(self._update_ids))
+        self.updates_sent += 1
+        deadline = started + self.timeout
+        while expected:
+            try:
+                method, received = await asyncio.wait_for(inbox.get(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return
+            if expected[method]:
+                expected -= collections.Counter([method])
+        self.latencies[flow].append(received - started)
+
+    async def run(
+        self, flow: str, chat_id: int, steps: Sequence[Step], barrier: Optional[asyncio.Barrier] = None
+    ) -> None:
+        half = len(steps) // 2
+        for index, step in enumerate(steps):
+            if index == half and barrier is not None:
+                await barrier.wait()
+                await barrier.wait()
+            await self._step(flow, chat_id, step)
+        self.completed += 1
+
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.setdefault("ORDER_STORE_PATH", os.path.join(workdir, "orders.sqlite3"))
+    os.environ.setdefault("MEDIA_CACHE_PATH", os.path.join(workdir, "media_cache.json"))
+    os.environ.setdefault("SCHEDULER_PATH", os.path.join(workdir, "jobs.sqlite3"))
+    os.environ.setdefault("RELAY_PATH", os.path.join(workdir, "relay.sqlite3"))
+    os.environ.setdefault("ASSET_CACHE_DIR", os.path.join(workdir, "asset_cache"))
+    os.environ.setdefault("MANAGER_ID", "1")
+    os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "1000")
+    os.environ.setdefault("OUTBOUND_CHAT_RATE", "1000")
+    os.environ.setdefault("THROTTLE_RATE", "0")
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import Homebot
+    import T_bot
+
+    server = FakeTelegram(latency=args.latency, flood_rate=args.flood_rate)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"), limit=1000)
+
+    flows = ["order", "calculate"] if args.flow == "both" else [args.flow]
+    modules = {"order": T_bot, "calculate": Homebot}
+    polling = []
+    for flow in flows:
+        bot = Bot(BOT_TOKENS[flow], session=session)
+        dp = modules[flow].create_dispatcher()
+        polling.append((dp, asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))))
+
+    users = VirtualUsers(server, timeout=args.timeout)
+    steps = {"order": ORDER_FLOW, "calculate": CALCULATE_FLOW}
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    barrier = asyncio.Barrier(args.users + 1)
+    started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(users.run(flows[n % len(flows)], 10_000 + n, steps[flows[n % len(flows)]], barrier))
+        for n in range(args.users)
+    ]
+    # Every user is now halfway through its flow: measure, then let them finish.
+    await barrier.wait()
+    per_conversation = (tracemalloc.get_traced_memory()[0] - baseline) / args.users
+    await barrier.wait()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+
+    for dp, task in polling:
+        await dp.stop_polling()
+        await task
+    await runner.cleanup()
+
+    print(f"users: {args.users}, flows: {', '.join(flows)}, duration: {elapsed:.2f}s")
+    print(f"completed flows: {users.completed} ({users.completed / elapsed:.1f}/s)")
+    print(f"updates: {users.updates_sent} ({users.updates_sent / elapsed:.1f}/s), timed out steps: {users.timeouts}")
+    for flow in flows:
+        latencies = users.latencies[flow]
+        print(
+            f"{flow} reply latency: p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms, "
+            f"mean {statistics.fmean(latencies) * 1000 if latencies else 0:.1f}ms"
+        )
+    print(f"memory per active conversation: {per_conversation / 1024:.1f} KiB")
+    print(f"API calls: {dict(server.calls)}, injected 429s: {server.floods}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the bots against a local stub Bot API server.")
+    parser.add_argument("--users", type=int, default=100, help="concurrent virtual users")
+    parser.add_argument("--flow", choices=("order", "calculate", "both"), default="both")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for a reply")
+    parser.add_argument("--port", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import logging
+import os
+from contextlib import suppress
+from typing import Dict, Iterable, Tuple, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import FSInputFile, Message
+
+
+class MediaCache:
+    """Maps local images to Telegram file_ids so every file is uploaded only once.
+
+    Entries are keyed by bot id, path and content hash: a file_id only works
+    for the bot that uploaded it, and a replaced image gets a new key and is
+    uploaded again. The mapping is kept in a JSON file and survives restarts.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file_ids: Dict[str, str] = self._load()
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logging.warning("Media cache %s is unreadable, starting empty", self.path)
+            return {}
+
+    def _save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._file_ids, file, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def _key(self, bot_id: int, path: str) -> str:
+        stat = os.stat(path)
+        cached = self._digests.get(path)
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            with open(path, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            cached = (stat.st_mtime_ns, stat.st_size, digest)
+            self._digests[path] = cached
+        return f"{bot_id}:{path}:{cached[2]}"
+
+    def photo(self, bot_id: int, path: str) -> Union[str, FSInputFile]:
+        return self._file_ids.get(self._key(bot_id, path)) or FSInputFile(path)
+
+    def remember(self, bot_id: int, path: str, message: Message) -> None:
+        if not message.photo:
+            return
+        key = self._key(bot_id, path)
+        file_id = message.photo[-1].file_id
+        if self._file_ids.get(key) != file_id:
+            self._file_ids[key] = file_id
+            self._save()
+
+    def forget(self, bot_id: int, paths: Iterable[str]) -> None:
+        """Drops cached file_ids, e.g. after Telegram rejected them; the files are uploaded again."""
+        keys = [key for key in (self._key(bot_id, path) for path in paths) if key in self._file_ids]
+        for key in keys:
+            del self._file_ids[key]
+        if keys:
+            self._save()
+
+    async def warm_up(self, bot: Bot, chat_id: int, paths: Iterable[str]) -> None:
+        for path in paths:
+            if self._key(bot.id, path) in self._file_ids:
+                continue
+            sent = await bot.send_photo(chat_id=chat_id, photo=FSInputFile(path))
+            self.remember(bot.id, path, sent)
+            with suppress(TelegramAPIError):
+                await bot.delete_message(chat_id=chat_id, message_id=sent.message_id)
+        logging.info("Media cache is warm: %d file ids", len(self._file_ids))
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+import config
+from outbound import OutboundQueue, outbound
+
+MessageKey = Tuple[int, int]
+Content = Tuple[str, Optional[InlineKeyboardMarkup]]
+
+
+class DebouncedEdits:
+    """Coalesces rapid edits of the same message into one.
+
+    ``edit`` only records the wanted text and markup; the message is edited
+    ``delay`` seconds after the first change, with whatever content is latest
+    by then. Nothing is sent when that matches what the message already shows.
+    """
+
+    def __init__(
+        self, queue: OutboundQueue, delay: float = config.EDIT_DEBOUNCE, max_messages: int = 10000
+    ) -> None:
+        self.queue = queue
+        self.delay = delay
+        self.max_messages = max_messages
+        self._shown: "OrderedDict[MessageKey, Content]" = OrderedDict()
+        self._pending: Dict[MessageKey, Tuple[Bot, Content]] = {}
+        self._tasks: Dict[MessageKey, asyncio.Task] = {}
+        self._running: Set[asyncio.Task] = set()
+
+    def shown(self, chat_id: int, message_id: int, text: str, markup: Optional[InlineKeyboardMarkup]) -> None:
+        """Records what a freshly sent message displays."""
+        key = (chat_id, message_id)
+        self._shown[key] = (text, markup)
+        self._shown.move_to_end(key)
+        while len(self._shown) > self.max_messages:
+            self._shown.popitem(last=False)
+
+    def edit(
+        self, bot: Bot, chat_id: int, message_id: int, text: str, markup: Optional[InlineKeyboardMarkup]
+    ) -> None:
+        key = (chat_id, message_id)
+        self._pending[key] = (bot, (text, markup))
+        if key not in self._tasks:
+            task = self._tasks[key] = asyncio.create_task(self._flush_later(key))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    def discard(self, chat_id: int, message_id: int) -> None:
+        """Drops a pending edit, e.g. because the message is about to change otherwise."""
+        key = (chat_id, message_id)
+        self._pending.pop(key, None)
+        self._shown.pop(key, None)
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    async def _flush_later(self, key: MessageKey) -> None:
+        await asyncio.sleep(self.delay)
+        del self._tasks[key]
+        try:
+            await self.flush(key)
+        except Exception:
+            logging.exception("Editing message %s failed", key)
+
+    async def flush(self, key: MessageKey) -> None:
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        bot, content = pending
+        if self._shown.get(key) == content:
+            return
+        chat_id, message_id = key
+        text, markup = content
+        try:
+            await self.queue.send(
+                chat_id,
+                lambda: bot.edit_message_text(
+                    text=text, chat_id=chat_id, message_id=message_id, reply_markup=markup
+                ),
+            )
+        except TelegramBadRequest as error:
+            if "message is not modified" not in error.message:
+                raise
+        self.shown(chat_id, message_id, text, markup)
+
+    async def close(self) -> None:
+        for key, task in list(self._tasks.items()):
+            task.cancel()
+            del self._tasks[key]
+        for key in list(self._pending):
+            try:
+                await self.flush(key)
+            except Exception:
+                logging.exception("Editing message %s failed", key)
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+
+class MessageLocks:
+    """One lock per message, for read-modify-writes of state tied to it.
+
+    Polling handles updates as concurrent tasks, so two quick taps on the same
+    inline keyboard can otherwise both read the old state. A lock is dropped
+    as soon as nobody holds or waits for it.
+    """
+
+    def __init__(self) -> None:
+        self._locks: Dict[MessageKey, Tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def hold(self, chat_id: int, message_id: int) -> AsyncIterator[None]:
+        key = (chat_id, message_id)
+        lock, users = self._locks.get(key) or (asyncio.Lock(), 0)
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+
+debounced_edits = DebouncedEdits(outbound)
+message_locks = MessageLocks()
@@ -0,0 +1,170 @@
+import bisect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.types import TelegramObject, Update
+
+import config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = (f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in zip(names, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: counts per bucket (last one is +Inf) and the sum.
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts, total = self.values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {total[0]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+UPDATES = Counter("bot_updates_total", "Updates received", ("bot", "type", "state"))
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Handler run time", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlers that raised", ("handler",))
+STATE_TRANSITIONS = Counter(
+    "bot_state_transitions_total", "Conversation steps, for funnel analysis", ("from_state", "to_state")
+)
+API_SECONDS = Histogram("bot_api_seconds", "Bot API call latency", ("method",))
+API_ERRORS = Counter("bot_api_errors_total", "Failed Bot API calls", ("method", "kind"))
+THROTTLED = Counter("bot_throttled_total", "Updates rejected by per-user throttling", ("key", "action"))
+
+REGISTRY = (
+    UPDATES,
+    HANDLER_SECONDS,
+    HANDLER_ERRORS,
+    STATE_TRANSITIONS,
+    API_SECONDS,
+    API_ERRORS,
+    THROTTLED,
+)
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+async def timed(name: str, call: Callable[[], Awaitable[Any]]) -> Any:
+    started = time.perf_counter()
+    try:
+        return await call()
+    except Exception:
+        HANDLER_ERRORS.inc(name)
+        raise
+    finally:
+        HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Counts updates by type and state and records state transitions."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        before: Optional[str] = data.get("raw_state")
+        UPDATES.inc(str(data["bot"].id), event.event_type, before or "none")
+        try:
+            return await handler(event, data)
+        finally:
+            state = data.get("state")
+            if state is not None:
+                after = await state.get_state()
+                if after != before:
+                    STATE_TRANSITIONS.inc(before or "none", after or "none")
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            API_ERRORS.inc(name, "429")
+            raise
+        except TelegramAPIError:
+            API_ERRORS.inc(name, "error")
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, name)
+
+
+_server: Optional[web.AppRunner] = None
+
+
+async def _instrument_bot(bot: Bot) -> None:
+    global _server
+    if not getattr(bot.session, "_metrics_installed", False):
+        bot.session.middleware(RequestMetricsMiddleware())
+        bot.session._metrics_installed = True
+    if config.METRICS_PORT and _server is None:
+        app = web.Application()
+        app.router.add_get("/metrics", _metrics_view)
+        _server = web.AppRunner(app)
+        await _server.setup()
+        await web.TCPSite(_server, config.METRICS_HOST, config.METRICS_PORT).start()
+        logging.info("Metrics on %s:%d/metrics", config.METRICS_HOST, config.METRICS_PORT)
+
+
+async def _metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+def setup(dp: Dispatcher) -> None:
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.startup.register(_instrument_bot)
@@ -0,0 +1,28 @@
+import asyncio
+import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from order_store import OrderStore
+
+
+class OrderSink:
+    """Saves orders on a background thread so slow disks never block the bot."""
+
+    def __init__(self, store: OrderStore) -> None:
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="order-sink")
+
+    @staticmethod
+    def new_order_id() -> str:
+        now = datetime.datetime.now()
+        return now.strftime("%d%m%Y_%H_%M") + "_" + uuid.uuid4().hex[:8]
+
+    async def save(self, order: Dict[str, Any]) -> str:
+        order_id = self.new_order_id()
+        loop = asyncio.get_running_loop()
+        added = await loop.run_in_executor(self._executor, self.store.add, order_id, order)
+        if not added:
+            raise RuntimeError(f"Order id {order_id} is already taken")
+        return order_id
@@ -0,0 +1,148 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, TextIO, Tuple
+
+import config
+from order_store import OrderStore
+
+# Report name, order column and the title used in /stats.
+DIMENSIONS = (
+    ("style", "interior_style", "Стиль интерьера"),
+    ("city", "your_location", "Где клиент во время ремонта"),
+    ("start", "overhauls_date", "Начало ремонта"),
+)
+
+
+class OrderStats:
+    """Monthly order counts per style, city and start date, updated incrementally.
+
+    The counts and the id of the last counted order are kept in a JSON
+    checkpoint, so each update only streams the orders added since, and memory
+    depends on the number of distinct answers and months, not on orders.
+    """
+
+    def __init__(self, path: str = config.STATS_PATH) -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self.last_id = 0
+        # dimension -> month ("YYYY-MM") -> answer -> count
+        self.counts: Dict[str, Dict[str, Dict[str, int]]] = {name: {} for name, _, _ in DIMENSIONS}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                checkpoint = json.load(file)
+            self.last_id = checkpoint["last_id"]
+            self.counts.update(checkpoint["counts"])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError):
+            logging.warning("Stats checkpoint %s is unreadable, recounting", self.path)
+
+    def _save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"last_id": self.last_id, "counts": self.counts}, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.last_id = 0
+            self.counts = {name: {} for name, _, _ in DIMENSIONS}
+
+    def update(self, store: OrderStore, batch_size: int = 1000) -> int:
+        """Counts orders added since the checkpoint and returns how many there were."""
+        with self._lock:
+            if self.last_id > store.max_id():
+                # The store was replaced; the checkpoint describes other orders.
+                self.last_id = 0
+                self.counts = {name: {} for name, _, _ in DIMENSIONS}
+            counted = 0
+            for order in store.iter_since(self.last_id, batch_size):
+                month = order["created_at"][:7]
+                for name, column, _ in DIMENSIONS:
+                    # Legacy orders have answers wrapped over several lines.
+                    answer = " ".join((order[column] or "").split()) or "—"
+                    answers = self.counts[name].setdefault(month, {})
+                    answers[answer] = answers.get(answer, 0) + 1
+                self.last_id = order["id"]
+                counted += 1
+            if counted:
+                self._save()
+            return counted
+
+    def totals(self, dimension: str) -> List[Tuple[str, int]]:
+        totals: Dict[str, int] = {}
+        with self._lock:
+            for answers in self.counts[dimension].values():
+                for answer, count in answers.items():
+                    totals[answer] = totals.get(answer, 0) + count
+        return sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+
+    def write_csv(self, target: TextIO) -> None:
+        writer = csv.writer(target)
+        writer.writerow(["report", "month", "value", "orders"])
+        with self._lock:
+            for name, _, _ in DIMENSIONS:
+                for month, answers in sorted(self.counts[name].items()):
+                    for answer, count in sorted(answers.items()):
+                        writer.writerow([name, month, answer, count])
+
+    def chart(self, dimension: str, width: int = 20, limit: int = 15) -> str:
+        """Text bar chart of the ``limit`` most frequent answers, for a monospace block."""
+        totals = self.totals(dimension)
+        if not totals:
+            return "нет данных"
+        shown, rest = totals[:limit], totals[limit:]
+        top = shown[0][1]
+        label_width = max(len(answer) for answer, _ in shown)
+        lines = [
+            f"{answer:<{label_width}} {'█' * max(1, round(count / top * width))} {count}"
+            for answer, count in shown
+        ]
+        if rest:
+            lines.append(f"и еще {len(rest)} вариантов: {sum(count for _, count in rest)}")
+        return "\n".join(lines)
+
+
+def write_report(stats: OrderStats, report_format: str, target: TextIO) -> None:
+    if report_format == "csv":
+        stats.write_csv(target)
+        return
+    for name, _, title in DIMENSIONS:
+        target.write(f"{title}:\n{stats.chart(name)}\n\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Order counts by interior style, city and start date.")
+    parser.add_argument("--format", choices=("csv", "chart"), default="csv")
+    parser.add_argument("-o", "--output", help="where to write the report (default: stdout)")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the checkpoint and recount every order")
+    args = parser.parse_args()
+    store = OrderStore()
+    stats = OrderStats()
+    if args.rebuild:
+        stats.reset()
+    started = time.perf_counter()
+    counted = stats.update(store)
+    print(
+        f"counted {counted} new orders in {time.perf_counter() - started:.3f}s, last id {stats.last_id}",
+        file=sys.stderr,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as target:
+            write_report(stats, args.format, target)
+    else:
+        write_report(stats, args.format, sys.stdout)
+    store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
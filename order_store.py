@@ -0,0 +1,190 @@
+import datetime
+import glob
+import os
+import re
+import sqlite3
+import sys
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+import config
+
+# Column name and the label used in order documents and the legacy .txt files.
+FIELDS = (
+    ("client_id", "Id клиента"),
+    ("client_name", "Имя клиента"),
+    ("overhauls_place", "Ремонт планируется"),
+    ("house_area", "Площадь дома/квартиры"),
+    ("interior_style", "Интерьер в стиле"),
+    ("design_project", "Нужен ли дизайн проект?"),
+    ("overhauls_date", "Начало ремонта"),
+    ("address", "Адрес клиента"),
+    ("your_location", "Во время ремонта клиент будет находиться"),
+    ("how_to_tell", "Стоимость ремонта сообщить"),
+    ("phone_number", "Телефон клиента"),
+)
+COLUMNS = tuple(column for column, _ in FIELDS)
+LABELS = {label: column for column, label in FIELDS}
+
+LEGACY_NAME = re.compile(r"Order_from_(\d{8}_\d{2}_\d{2})")
+
+
+def format_order(order: Dict[str, Any]) -> str:
+    return "\n".join(
+        f"{label}: {order[column]}" for column, label in FIELDS if order.get(column) is not None
+    )
+
+
+class OrderStore:
+    """Orders in one SQLite table, indexed by client, date and phone.
+
+    Rows are only ever inserted, so the table doubles as the order log.
+    """
+
+    def __init__(self, path: str = config.ORDER_STORE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS orders ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " order_id TEXT NOT NULL UNIQUE,"
+                " created_at TEXT NOT NULL,"
+                + ", ".join(f"{column} TEXT" for column in COLUMNS)
+                + ")"
+            )
+            for column in ("client_id", "created_at", "phone_number"):
+                self._connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS orders_{column} ON orders ({column})"
+                )
+
+    def add(
+        self,
+        order_id: str,
+        order: Dict[str, Any],
+        created_at: Optional[datetime.datetime] = None,
+    ) -> bool:
+        created_at = created_at or datetime.datetime.now()
+        values = [order.get(column) for column in COLUMNS]
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO orders (order_id, created_at, "
+                + ", ".join(COLUMNS)
+                + ") VALUES (?, ?, "
+                + ", ".join("?" for _ in COLUMNS)
+                + ")",
+                [order_id, created_at.isoformat(sep=" ", timespec="seconds")]
+                + [None if value is None else str(value) for value in values],
+            )
+        return cursor.rowcount == 1
+
+    def _select(self, where: str, params: List[Any], limit: int = -1) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT * FROM orders WHERE {where} ORDER BY id LIMIT ?", params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._select("order_id = ?", [order_id])
+        return rows[0] if rows else None
+
+    def by_client(self, client_id: int) -> List[Dict[str, Any]]:
+        return self._select("client_id = ?", [str(client_id)])
+
+    def by_phone(self, phone_number: str) -> List[Dict[str, Any]]:
+        return self._select("phone_number = ?", [phone_number])
+
+    def between(self, start: datetime.date, end: datetime.date) -> List[Dict[str, Any]]:
+        """Orders created on ``start`` up to, but not including, ``end``."""
+        return self._select(
+            "created_at >= ? AND created_at < ?", [start.isoformat(), end.isoformat()]
+        )
+
+    def segment(
+        self,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+        style: Optional[str] = None,
+        city: Optional[str] = None,
+    ) -> List[int]:
+        """Distinct client ids with orders matching every given criterion.
+
+        ``city`` is matched as a substring of the address or
+        of the answer about where the client stays during the renovation.
+        """
+        where, params = ["client_id IS NOT NULL"], []
+        if start is not None:
+            where.append("created_at >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            where.append("created_at < ?")
+            params.append(end.isoformat())
+        if style is not None:
+            where.append("interior_style = ?")
+            params.append(style)
+        if city is not None:
+            where.append("(address LIKE ? OR your_location LIKE ?)")
+            params += [f"%{city}%"] * 2
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT client_id FROM orders WHERE " + " AND ".join(where), params
+            ).fetchall()
+        return [int(row[0]) for row in rows]
+
+    def iter_since(self, last_id: int = 0, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Streams orders with ``id > last_id`` in batches, oldest first."""
+        while True:
+            batch = self._select("id > ?", [last_id], limit=batch_size)
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1]["id"]
+
+    def max_id(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def parse_legacy_order(path: str) -> Dict[str, Any]:
+    order: Dict[str, Any] = {}
+    column = None
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.rstrip("\n")
+            label, separator, value = line.partition(": ")
+            if separator and label in LABELS:
+                column = LABELS[label]
+                order[column] = value.strip()
+            elif column is not None and line.strip():
+                # Answers that wrapped onto the next line in the old files.
+                order[column] += " " + line.strip()
+    return order
+
+
+def import_legacy_orders(store: OrderStore, directory: str = "orders") -> int:
+    imported = 0
+    for path in sorted(glob.glob(os.path.join(directory, "Order_from_*.txt"))):
+        match = LEGACY_NAME.search(os.path.basename(path))
+        if match is None:
+            continue
+        order_id = os.path.basename(path)[len("Order_from_"):-len(".txt")]
+        created_at = datetime.datetime.strptime(match.group(1), "%d%m%Y_%H_%M")
+        if store.add(order_id, parse_legacy_order(path), created_at=created_at):
+            imported += 1
+    return imported
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["import"]:
+        sys.exit("Usage: python order_store.py import [orders_directory]")
+    directory = sys.argv[2] if len(sys.argv) > 2 else "orders"
+    order_store = OrderStore()
+    print(f"Imported {import_legacy_orders(order_store, directory)} orders into {order_store.path}")
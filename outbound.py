@@ -0,0 +1,168 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Set, Tuple, TypeVar
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import BufferedInputFile
+
+import config
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        """Takes one token and returns how long to wait before it may be used.
+
+        Tokens may go negative: every caller books the next free slot, so
+        waiting senders are served in arrival order.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        """True once the bucket has refilled; it then holds no state worth keeping."""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class OutboundQueue:
+    """Rate-limited path for outgoing Bot API calls shared by all bots.
+
+    Each call waits for a slot in the global bucket and in its chat's bucket,
+    honours ``retry_after`` from Telegram and retries network and server
+    errors with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = config.OUTBOUND_GLOBAL_RATE,
+        chat_rate: float = config.OUTBOUND_CHAT_RATE,
+        chat_burst: int = 3,
+        max_retries: int = 5,
+    ) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        # Least recently used first: idle buckets are always at the head.
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is not None:
+            self._chat_buckets.move_to_end(chat_id)
+            return bucket
+        # Buckets that are not idle were used within the last few seconds,
+        # so their number stays bounded by the global rate.
+        while self._chat_buckets and next(iter(self._chat_buckets.values())).idle(now):
+            self._chat_buckets.popitem(last=False)
+        bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _acquire(self, chat_id: int) -> None:
+        now = time.monotonic()
+        delay = max(
+            self.global_bucket.reserve(now), self._chat_bucket(chat_id, now).reserve(now)
+        )
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def send(self, chat_id: int, call: Callable[[], Awaitable[T]]) -> T:
+        for attempt in itertools.count():
+            await self._acquire(chat_id)
+            try:
+                return await call()
+            except TelegramRetryAfter as error:
+                if attempt == self.max_retries:
+                    raise
+                delay = error.retry_after
+            except (TelegramNetworkError, TelegramServerError):
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 30)
+            logging.warning("Send to chat %s failed, retry %d in %ss", chat_id, attempt + 1, delay)
+            await asyncio.sleep(delay)
+
+
+class ManagerDigest:
+    """Sends new orders to the manager, optionally grouped within a time window."""
+
+    def __init__(
+        self,
+        queue: OutboundQueue,
+        chat_id: int = config.MANAGER_ID,
+        window: float = config.MANAGER_DIGEST_WINDOW,
+    ) -> None:
+        self.queue = queue
+        self.chat_id = chat_id
+        self.window = window
+        self._pending: List[Tuple[str, str]] = []
+        self._bot: Optional[Bot] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def add(self, bot: Bot, order_id: str, text: str) -> None:
+        # Sending happens in the background so a busy manager chat never
+        # delays the reply to the client.
+        self._bot = bot
+        self._pending.append((order_id, text))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+            self._tasks.add(self._flush_task)
+            self._flush_task.add_done_callback(self._tasks.discard)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            logging.exception("Sending orders to the manager failed")
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, []
+        if not pending or self._bot is None:
+            return
+        bot = self._bot
+        if len(pending) == 1:
+            order_id, text = pending[0]
+            filename = f"Order_from_{order_id}.txt"
+            caption = None
+        else:
+            text = "\n\n".join(f"Заказ {order_id}\n{text}" for order_id, text in pending)
+            filename = f"Orders_from_{pending[0][0]}_x{len(pending)}.txt"
+            caption = f"Новых заказов: {len(pending)}"
+        document = BufferedInputFile(text.encode("utf-8"), filename=filename)
+        await self.queue.send(
+            self.chat_id,
+            lambda: bot.send_document(chat_id=self.chat_id, document=document, caption=caption),
+        )
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+outbound = OutboundQueue()
+manager_digest = ManagerDigest(outbound)
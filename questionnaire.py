@@ -0,0 +1,86 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.types import Message
+
+from dispatch_index import DispatchIndex
+from keyboards import REMOVE, Keyboard
+
+
+@dataclass(frozen=True)
+class Question:
+    state: State
+    prompt: str
+    # Answers must be one of the keyboard's options unless a validator is given.
+    keyboard: Optional[Keyboard] = None
+    validator: Optional[Callable[[str], bool]] = None
+    error: str = "Нажмите одну из кнопок ниже."
+    # Sent concurrently with the prompt, e.g. a photo gallery.
+    attachment: Optional[Callable[[Message], Awaitable[Any]]] = None
+
+    @property
+    def key(self) -> str:
+        return self.state.state.rpartition(":")[2]
+
+    def accepts(self, text: str) -> bool:
+        if self.validator is not None:
+            return self.validator(text)
+        if self.keyboard is not None:
+            return text in self.keyboard.options
+        return bool(text)
+
+
+class Questionnaire:
+    """Runs a linear list of questions with one handler and a state routing table.
+
+    Each answer is stored in FSM data under the question's state name; after
+    the last answer ``on_complete`` receives the collected data.
+    """
+
+    def __init__(
+        self,
+        questions: Sequence[Question],
+        on_complete: Callable[[Message, FSMContext, Dict[str, Any]], Awaitable[None]],
+    ) -> None:
+        self.first = questions[0]
+        self.on_complete = on_complete
+        self._routes: Dict[str, tuple] = {
+            question.state.state: (question, following)
+            for question, following in zip(questions, [*questions[1:], None])
+        }
+
+    async def start(self, message: Message, state: FSMContext, prefix: str = "") -> None:
+        await self.ask(self.first, message, state, prefix)
+
+    async def ask(
+        self, question: Question, message: Message, state: FSMContext, prefix: str = ""
+    ) -> None:
+        await state.set_state(question.state)
+        prompt = message.bot(
+            message.answer(
+                prefix + question.prompt,
+                reply_markup=question.keyboard.markup if question.keyboard else REMOVE,
+            )
+        )
+        if question.attachment is None:
+            await prompt
+        else:
+            await asyncio.gather(question.attachment(message), prompt)
+
+    async def _answer(self, message: Message, state: FSMContext, raw_state: str) -> None:
+        question, following = self._routes[raw_state]
+        text = message.text or ""
+        if not question.accepts(text):
+            await message.answer(question.error)
+            return
+        data = await state.update_data({question.key: text})
+        if following is None:
+            await self.on_complete(message, state, data)
+        else:
+            await self.ask(following, message, state)
+
+    def register(self, index: DispatchIndex) -> None:
+        index.state(*self._routes)(self._answer)
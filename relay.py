@@ -0,0 +1,102 @@
+import asyncio
+import itertools
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+import config
+
+RelayKey = Tuple[int, int]
+
+
+class RelayMap:
+    """Remembers which client each message forwarded to the manager came from.
+
+    Keyed by bot id and the forwarded message's id in the manager chat. Entries
+    expire after ``ttl`` seconds and are stored in SQLite; the most recently
+    used ones are also kept in a dict so replies to live threads never touch
+    the disk.
+    """
+
+    def __init__(
+        self,
+        path: str = config.RELAY_PATH,
+        ttl: float = config.RELAY_TTL,
+        cache_size: int = 10000,
+        purge_every: int = 1000,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.purge_every = purge_every
+        self._cache: "OrderedDict[RelayKey, Tuple[int, float]]" = OrderedDict()
+        self._writes = itertools.count(1)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="relay")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS relay ("
+                " bot_id INTEGER, message_id INTEGER, client_chat_id INTEGER, expires_at REAL,"
+                " PRIMARY KEY (bot_id, message_id)) WITHOUT ROWID"
+            )
+        return self._connection
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _cache_put(self, key: RelayKey, value: Tuple[int, float]) -> None:
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _insert(self, key: RelayKey, client_chat_id: int, expires_at: float, purge: bool) -> None:
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO relay (bot_id, message_id, client_chat_id, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (*key, client_chat_id, expires_at),
+            )
+            if purge:
+                connection.execute("DELETE FROM relay WHERE expires_at < ?", (time.time(),))
+
+    def _select(self, key: RelayKey) -> Optional[Tuple[int, float]]:
+        return self._connect().execute(
+            "SELECT client_chat_id, expires_at FROM relay WHERE bot_id = ? AND message_id = ?", key
+        ).fetchone()
+
+    async def remember(self, bot_id: int, message_id: int, client_chat_id: int) -> None:
+        key = (bot_id, message_id)
+        expires_at = time.time() + self.ttl
+        self._cache_put(key, (client_chat_id, expires_at))
+        purge = next(self._writes) % self.purge_every == 0
+        await self._run(self._insert, key, client_chat_id, expires_at, purge)
+
+    async def client_for(self, bot_id: int, message_id: int) -> Optional[int]:
+        key = (bot_id, message_id)
+        entry = self._cache.get(key)
+        if entry is None:
+            entry = await self._run(self._select, key)
+            if entry is None:
+                return None
+            self._cache_put(key, entry)
+        else:
+            self._cache.move_to_end(key)
+        client_chat_id, expires_at = entry
+        return client_chat_id if expires_at >= time.time() else None
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+
+
+relay_map = RelayMap()
@@ -0,0 +1,67 @@
+import asyncio
+import importlib
+import logging
+import signal
+import sys
+from contextlib import suppress
+from typing import List, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+
+import config
+import webhook
+from outbound import manager_digest
+from storage import create_storage
+
+
+def load_bots(specs: List[str]) -> List[Tuple[str, Bot, object]]:
+    bots = []
+    for spec in specs:
+        module_name, _, attribute = spec.partition(":")
+        module = importlib.import_module(module_name)
+        bots.append((module_name.lower(), getattr(module, attribute or "bot"), module))
+    return bots
+
+
+async def main():
+    storage = create_storage()
+    session = AiohttpSession()
+    bots: List[Tuple[Dispatcher, Bot, str]] = []
+    for name, bot, module in load_bots(config.BOTS):
+        # One connection pool for every bot instead of one per bot.
+        await bot.session.close()
+        bot.session = session
+        bots.append((module.create_dispatcher(storage=storage), bot, name))
+
+    try:
+        if config.BOT_MODE == "webhook":
+            # Returns on SIGINT or SIGTERM once the dispatchers have shut down.
+            await webhook.serve(bots)
+            return
+        loop = asyncio.get_running_loop()
+
+        async def stop_polling(dp: Dispatcher) -> None:
+            with suppress(RuntimeError):
+                await dp.stop_polling()
+
+        def stop() -> None:
+            logging.info("Stopping %d bots", len(bots))
+            for dp, _, _ in bots:
+                asyncio.ensure_future(stop_polling(dp))
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError):
+                loop.add_signal_handler(signum, stop)
+        await asyncio.gather(
+            *(dp.start_polling(bot, handle_signals=False) for dp, bot, _ in bots)
+        )
+    finally:
+        await manager_digest.close()
+        await storage.close()
+        await session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    asyncio.run(main())
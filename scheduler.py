@@ -0,0 +1,303 @@
+import asyncio
+import heapq
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Set, Tuple, Type
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.types import TelegramObject, Update
+
+import config
+from outbound import outbound
+
+# Receives the job's bot (None for jobs not tied to one) and payload; may
+# return a delay in seconds to run the job again.
+JobHandler = Callable[[Optional[Bot], Dict[str, Any]], Awaitable[Optional[float]]]
+
+
+class Scheduler:
+    """Runs persistent delayed jobs inside the bot process.
+
+    Jobs live in SQLite, keyed by name, so scheduling a key again replaces the
+    job. Only jobs due within ``horizon`` seconds are kept in an in-memory heap;
+    the rest cost one row on disk until a periodic range query picks them up.
+    A job's row is deleted when it runs, so stale heap entries left behind by
+    rescheduling or by another process are skipped.
+    """
+
+    def __init__(
+        self,
+        path: str = config.SCHEDULER_PATH,
+        horizon: float = 60.0,
+        concurrency: int = 20,
+    ) -> None:
+        self.path = path
+        self.horizon = horizon
+        self.handlers: Dict[str, JobHandler] = {}
+        self.bots: Dict[int, Bot] = {}
+        self.storages: Dict[int, BaseStorage] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scheduler")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._heap: List[Tuple[float, str]] = []
+        self._queued: Set[Tuple[float, str]] = set()
+        self._loaded_until = float("-inf")
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._loop_task: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def handler(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        def register(handler: JobHandler) -> JobHandler:
+            self.handlers[kind] = handler
+            return handler
+
+        return register
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " key TEXT PRIMARY KEY, kind TEXT, bot_id INTEGER, run_at REAL, payload TEXT)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_run_at ON jobs (run_at)")
+        return self._connection
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _upsert(self, key: str, kind: str, bot_id: Optional[int], run_at: float, payload: str) -> None:
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO jobs (key, kind, bot_id, run_at, payload) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, bot_id, run_at, payload),
+            )
+
+    def _delete(self, key: str) -> None:
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM jobs WHERE key = ?", (key,))
+
+    def _due(self, until: float, bot_ids: Tuple[int, ...]) -> List[Tuple[float, str]]:
+        placeholders = ",".join("?" * len(bot_ids)) or "NULL"
+        return self._connect().execute(
+            "SELECT run_at, key FROM jobs WHERE run_at <= ?"
+            f" AND (bot_id IS NULL OR bot_id IN ({placeholders}))",
+            (until, *bot_ids),
+        ).fetchall()
+
+    def _take(self, due: List[Tuple[float, str]]) -> List[Tuple[str, str, Optional[int], Dict[str, Any]]]:
+        """Removes and returns the due jobs whose rows still match their heap entries."""
+        jobs = []
+        connection = self._connect()
+        with connection:
+            for run_at, key in due:
+                row = connection.execute(
+                    "SELECT kind, bot_id, payload FROM jobs WHERE key = ? AND run_at = ?", (key, run_at)
+                ).fetchone()
+                if row is not None:
+                    connection.execute("DELETE FROM jobs WHERE key = ?", (key,))
+                    jobs.append((key, row[0], row[1], json.loads(row[2])))
+        return jobs
+
+    def _push(self, run_at: float, key: str) -> None:
+        if (run_at, key) not in self._queued:
+            self._queued.add((run_at, key))
+            heapq.heappush(self._heap, (run_at, key))
+
+    async def schedule(
+        self,
+        key: str,
+        kind: str,
+        delay: float,
+        payload: Optional[Mapping[str, Any]] = None,
+        bot_id: Optional[int] = None,
+    ) -> None:
+        """Runs ``kind``'s handler in ``delay`` seconds, replacing any job under ``key``."""
+        run_at = time.time() + delay
+        await self._run(
+            self._upsert, key, kind, bot_id, run_at, json.dumps(dict(payload or {}), ensure_ascii=False)
+        )
+        if run_at <= self._loaded_until:
+            self._push(run_at, key)
+            self._wakeup.set()
+
+    async def cancel(self, key: str) -> None:
+        await self._run(self._delete, key)
+
+    def attach(self, bot: Bot, storage: BaseStorage) -> None:
+        """Lets jobs of ``bot`` run in this process and starts the scheduler loop."""
+        self.bots[bot.id] = bot
+        self.storages[bot.id] = storage
+        # Load the new bot's due jobs on the next pass.
+        self._loaded_until = float("-inf")
+        self._wakeup.set()
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._loop())
+
+    async def _load(self, until: float) -> None:
+        for run_at, key in await self._run(self._due, until, tuple(self.bots)):
+            self._push(run_at, key)
+        self._loaded_until = until
+
+    async def _loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            if now + self.horizon / 2 >= self._loaded_until:
+                try:
+                    await self._load(now + self.horizon)
+                except sqlite3.Error:
+                    logging.exception("Loading scheduled jobs failed")
+            due = []
+            while self._heap and self._heap[0][0] <= now and len(due) < 1000:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry)
+                due.append(entry)
+            try:
+                jobs = await self._run(self._take, due) if due else []
+            except sqlite3.Error:
+                logging.exception("Taking due jobs failed")
+                jobs = []
+            for job in jobs:
+                await self._slots.acquire()
+                task = asyncio.create_task(self._fire(*job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            timeout = self._loaded_until - self.horizon / 2 - now
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key: str, kind: str, bot_id: Optional[int], payload: Dict[str, Any]) -> None:
+        try:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                logging.warning("No handler for job %s of kind %r", key, kind)
+                return
+            bot = self.bots.get(bot_id) if bot_id is not None else None
+            again = await handler(bot, payload)
+            if again is not None:
+                await self.schedule(key, kind, again, payload, bot_id)
+        except Exception:
+            logging.exception("Scheduled job %s failed", key)
+        finally:
+            self._slots.release()
+
+    async def close(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+
+
+scheduler = Scheduler()
+
+
+def _reminder_key(bot_id: int, chat_id: int, user_id: int) -> str:
+    return f"reminder:{bot_id}:{chat_id}:{user_id}"
+
+
+@scheduler.handler("reminder")
+async def send_reminder(bot: Optional[Bot], payload: Dict[str, Any]) -> None:
+    """Nudges a client whose conversation is still where it was when the job was set."""
+    storage = scheduler.storages.get(payload["bot_id"])
+    if bot is None or storage is None:
+        return
+    key = StorageKey(bot_id=payload["bot_id"], chat_id=payload["chat_id"], user_id=payload["user_id"])
+    if await FSMContext(storage, key).get_state() != payload["state"]:
+        return
+    await outbound.send(
+        payload["chat_id"],
+        lambda: bot.send_message(payload["chat_id"], payload["text"]),
+    )
+
+
+@scheduler.handler("purge_fsm")
+async def purge_fsm(bot: Optional[Bot], payload: Dict[str, Any], batch_size: int = 1000) -> float:
+    """Deletes expired FSM records in small batches so the storage thread stays responsive."""
+    storage = scheduler.storages.get(payload["bot_id"])
+    purge = getattr(storage, "purge_expired", None)
+    if purge is not None:
+        purged = batch_size
+        while purged == batch_size:
+            purged = await purge(batch_size)
+            if purged:
+                logging.info("Purged %d expired conversations", purged)
+    return config.FSM_PURGE_INTERVAL
+
+
+class ReminderMiddleware(BaseMiddleware):
+    """Schedules a reminder whenever a conversation enters a step of a reminded flow."""
+
+    def __init__(self, flows: Mapping[Type[StatesGroup], str]) -> None:
+        self.flows = dict(flows)
+
+    def _reminder_text(self, state: Optional[str]) -> Optional[str]:
+        if state is None:
+            return None
+        for group, text in self.flows.items():
+            if state in group:
+                return text
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        before: Optional[str] = data.get("raw_state")
+        result = await handler(event, data)
+        state: Optional[FSMContext] = data.get("state")
+        if state is None:
+            return result
+        after = await state.get_state()
+        if after == before:
+            return result
+        key = state.key
+        job_key = _reminder_key(key.bot_id, key.chat_id, key.user_id)
+        text = self._reminder_text(after)
+        if text is not None:
+            await scheduler.schedule(
+                job_key,
+                "reminder",
+                config.REMINDER_DELAY,
+                {"bot_id": key.bot_id, "chat_id": key.chat_id, "user_id": key.user_id, "state": after, "text": text},
+                bot_id=key.bot_id,
+            )
+        elif self._reminder_text(before) is not None:
+            await scheduler.cancel(job_key)
+        return result
+
+
+def setup(dp: Dispatcher, reminders: Mapping[Type[StatesGroup], str]) -> None:
+    """Starts the shared scheduler with the bot and reminds clients who abandon ``reminders`` flows."""
+
+    async def attach(bot: Bot) -> None:
+        scheduler.attach(bot, dp.storage)
+        if hasattr(dp.storage, "purge_expired"):
+            await scheduler.schedule(
+                f"purge_fsm:{bot.id}", "purge_fsm", 0, {"bot_id": bot.id}, bot_id=bot.id
+            )
+
+    dp.startup.register(attach)
+    dp.shutdown.register(scheduler.close)
+    if config.REMINDER_DELAY:
+        dp.update.outer_middleware(ReminderMiddleware(reminders))
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import config
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage in a single SQLite file for single-node deployments.
+
+    All queries run on one worker thread, so the event loop never waits for
+    the disk. Records expire ``ttl`` seconds after their last update.
+    """
+
+    def __init__(self, path: str, ttl: Optional[int] = None) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fsm ("
+                " key TEXT PRIMARY KEY,"
+                " bot_id INTEGER, chat_id INTEGER, user_id INTEGER,"
+                " state TEXT, data TEXT,"
+                " updated_at REAL, expires_at REAL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS fsm_expires_at ON fsm (expires_at)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS dedup (key TEXT PRIMARY KEY, expires_at REAL)"
+            )
+        return self._connection
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _expires_at(self, now: float) -> Optional[float]:
+        return now + self.ttl if self.ttl else None
+
+    def _read(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT state, data, expires_at FROM fsm WHERE key = ?",
+            (self.key_builder.build(key),),
+        ).fetchone()
+        if row is None or (row[2] is not None and row[2] < time.time()):
+            return None, {}
+        return row[0], json.loads(row[1]) if row[1] else {}
+
+    def _write(self, key: StorageKey, column: str, value: Optional[str]) -> None:
+        state, data = self._read(key)
+        record = {
+            "state": state,
+            "data": json.dumps(data, ensure_ascii=False) if data else None,
+        }
+        record[column] = value
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO fsm"
+                " (key, bot_id, chat_id, user_id, state, data, updated_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.key_builder.build(key),
+                    key.bot_id,
+                    key.chat_id,
+                    key.user_id,
+                    record["state"],
+                    record["data"],
+                    now,
+                    self._expires_at(now),
+                ),
+            )
+
+    def _claim(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM dedup WHERE key = ? AND expires_at < ?", (key, now))
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO dedup (key, expires_at) VALUES (?, ?)", (key, now + ttl)
+            )
+        return cursor.rowcount == 1
+
+    def _release(self, key: str) -> None:
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM dedup WHERE key = ?", (key,))
+
+    def _purge_expired(self, limit: int) -> int:
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            cursor = connection.execute(
+                "DELETE FROM fsm WHERE key IN ("
+                " SELECT key FROM fsm WHERE expires_at < ? LIMIT ?)",
+                (now, limit),
+            )
+            connection.execute(
+                "DELETE FROM dedup WHERE key IN ("
+                " SELECT key FROM dedup WHERE expires_at < ? LIMIT ?)",
+                (now, limit),
+            )
+        return cursor.rowcount
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._run(self._write, key, "state", value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._run(self._read, key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        value = json.dumps(dict(data), ensure_ascii=False) if data else None
+        await self._run(self._write, key, "data", value)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._run(self._read, key)
+        return data
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        """Records ``key`` for ``ttl`` seconds; False if it is already recorded."""
+        return await self._run(self._claim, key, ttl)
+
+    async def release(self, key: str) -> None:
+        """Forgets a key recorded by ``claim``."""
+        await self._run(self._release, key)
+
+    async def purge_expired(self, limit: int = 1000) -> int:
+        return await self._run(self._purge_expired, limit)
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=False)
+
+
+class ExpiringMemoryStorage(MemoryStorage):
+    """``MemoryStorage`` whose records expire ``ttl`` seconds after their last update.
+
+    Update times are kept in last-update order, so ``purge_expired`` only looks
+    at records it removes. Reads never create records, and a record set back
+    to no state and no data is dropped at once.
+    """
+
+    def __init__(self, ttl: Optional[int] = None) -> None:
+        super().__init__()
+        self.ttl = ttl
+        self._updated: "OrderedDict[StorageKey, float]" = OrderedDict()
+
+    def _touch(self, key: StorageKey) -> None:
+        record = self.storage.get(key)
+        if record is None:
+            return
+        if record.state is None and not record.data:
+            del self.storage[key]
+            self._updated.pop(key, None)
+            return
+        self._updated[key] = time.monotonic()
+        self._updated.move_to_end(key)
+
+    def _live(self, key: StorageKey) -> bool:
+        updated = self._updated.get(key)
+        if updated is None:
+            return False
+        if self.ttl and updated + self.ttl < time.monotonic():
+            del self.storage[key]
+            del self._updated[key]
+            return False
+        return True
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._live(key)
+        await super().set_state(key, state)
+        self._touch(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self.storage[key].state if self._live(key) else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        self._live(key)
+        await super().set_data(key, data)
+        self._touch(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return await super().get_data(key) if self._live(key) else {}
+
+    async def get_value(self, storage_key: StorageKey, dict_key: str, default: Any = None) -> Any:
+        if not self._live(storage_key):
+            return default
+        return await super().get_value(storage_key, dict_key, default)
+
+    async def purge_expired(self, limit: int = 1000) -> int:
+        if not self.ttl:
+            return 0
+        deadline = time.monotonic() - self.ttl
+        purged = 0
+        updated = self._updated
+        while updated and purged < limit:
+            key, at = next(iter(updated.items()))
+            if at >= deadline:
+                break
+            updated.popitem(last=False)
+            del self.storage[key]
+            purged += 1
+        return purged
+
+
+def create_storage(url: str = config.FSM_STORAGE, ttl: Optional[int] = config.FSM_TTL) -> BaseStorage:
+    if url == "memory":
+        return ExpiringMemoryStorage(ttl=ttl)
+    if url.startswith("sqlite:///"):
+        return SQLiteStorage(url[len("sqlite:///"):], ttl=ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        # Any Redis-protocol server works here (Redis, KeyDB, a local stand-in).
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(
+            url,
+            key_builder=DefaultKeyBuilder(with_bot_id=True),
+            state_ttl=ttl,
+            data_ttl=ttl,
+        )
+    raise ValueError(f"Unsupported FSM_STORAGE: {url!r}")
@@ -0,0 +1,141 @@
+import asyncio
+import collections
+import datetime
+import itertools
+import os
+import sys
+import tempfile
+import types
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# config.py reads the environment on import, so this has to run first.
+WORKDIR = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ.update(
+    ORDER_STORE_PATH=os.path.join(WORKDIR, "orders.sqlite3"),
+    MEDIA_CACHE_PATH=os.path.join(WORKDIR, "media_cache.json"),
+    SCHEDULER_PATH=os.path.join(WORKDIR, "jobs.sqlite3"),
+    RELAY_PATH=os.path.join(WORKDIR, "relay.sqlite3"),
+    ASSET_CACHE_DIR=os.path.join(WORKDIR, "asset_cache"),
+    STATS_PATH=os.path.join(WORKDIR, "order_stats.json"),
+    MANAGER_ID="1",
+    OUTBOUND_GLOBAL_RATE="1000",
+    OUTBOUND_CHAT_RATE="1000",
+    THROTTLE_RATE="0",
+    REMINDER_DELAY="0",
+    ORDER_FOLLOWUP_DELAY="0",
+    EDIT_DEBOUNCE="0.05",
+)
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMediaGroup, TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+try:
+    import settings  # noqa: F401
+except ImportError:
+    # settings.py holds the production tokens and is not part of the repository.
+    settings = types.ModuleType("settings")
+    settings.bot = Bot("100001:TEST")
+    settings.bot2 = Bot("100002:TEST")
+    sys.modules["settings"] = settings
+
+from storage import SQLiteStorage
+
+_ids = itertools.count(1)
+
+
+class RecordingSession(BaseSession):
+    """Bot API stand-in: records every call and answers it like Telegram would."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls: List[TelegramMethod] = []
+        self.sent: Dict[int, List[Message]] = collections.defaultdict(list)
+
+    def _message(self, chat_id: int, text: Optional[str] = None) -> Message:
+        message = Message(
+            message_id=next(_ids),
+            date=datetime.datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            text=text,
+        )
+        self.sent[chat_id].append(message)
+        return message
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls.append(method)
+        # Yield like a network call would, so concurrent conversations interleave.
+        await asyncio.sleep(0)
+        chat_id = int(getattr(method, "chat_id", None) or 0)
+        if isinstance(method, SendMediaGroup):
+            return [self._message(chat_id) for _ in method.media]
+        if method.__returning__ is bool:
+            return True
+        return self._message(chat_id, getattr(method, "text", None))
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+    def texts(self, chat_id: int) -> List[str]:
+        return [
+            call.text
+            for call in self.calls
+            if getattr(call, "text", None) and int(getattr(call, "chat_id", 0) or 0) == chat_id
+        ]
+
+
+def message_update(user_id: int, text: str) -> Update:
+    return Update(
+        update_id=next(_ids),
+        message=Message(
+            message_id=next(_ids),
+            date=datetime.datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name=f"Client {user_id}"),
+            text=text,
+        ),
+    )
+
+
+def callback_update(user_id: int, data: str, message: Message) -> Update:
+    return Update(
+        update_id=next(_ids),
+        callback_query=CallbackQuery(
+            id=str(next(_ids)),
+            chat_instance=str(user_id),
+            from_user=User(id=user_id, is_bot=False, first_name=f"Client {user_id}"),
+            data=data,
+            message=message,
+        ),
+    )
+
+
+@pytest.fixture
+def api() -> RecordingSession:
+    return RecordingSession()
+
+
+# A router can be attached to one dispatcher only, so each bot gets one for the
+# whole session; SQLite storage makes every state access a real await.
+@pytest.fixture(scope="session")
+def order_dispatcher():
+    import T_bot
+
+    return T_bot.create_dispatcher(SQLiteStorage(os.path.join(WORKDIR, "t_bot_fsm.sqlite3"), ttl=3600))
+
+
+@pytest.fixture(scope="session")
+def calculate_dispatcher():
+    import Homebot
+
+    return Homebot.create_dispatcher(SQLiteStorage(os.path.join(WORKDIR, "homebot_fsm.sqlite3"), ttl=3600))
@@ -0,0 +1,58 @@
+import itertools
+
+import pytest
+
+import batch_quote
+from pricing import pricing_file
+
+
+@pytest.fixture(params=["numpy", "pure python"])
+def path(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(batch_quote, "numpy", None)
+    return request.param
+
+
+def test_rows_match_the_bot_quote(path):
+    pricing = pricing_file.get()
+    rows = [
+        (area, rooms, "|".join(service_ids))
+        for area in (1, 54)
+        for rooms in pricing.rooms
+        for size in range(3)
+        for service_ids in itertools.combinations(pricing.services, size)
+    ]
+    areas, rooms, services = ([str(value) for value in column] for column in zip(*rows))
+    expected = [pricing.quote(area, room, service_ids.split("|") if service_ids else []) for area, room, service_ids in rows]
+    assert batch_quote.quote_columns(pricing, areas, rooms, services) == expected
+
+
+def test_room_counts_are_matched_regardless_of_case(path):
+    pricing = pricing_file.get()
+    prices = batch_quote.quote_columns(pricing, ["40", "40"], ["студия", " Студия "], ["area_check"] * 2)
+    assert prices == [pricing.quote(40, "Студия", ["area_check"])] * 2
+
+
+@pytest.mark.parametrize("room", ["5", "", "Studio", "0"])
+def test_unknown_room_counts_are_rejected_with_their_line(path, room):
+    with pytest.raises(ValueError, match=f"line 4: rooms must be one of .*got {room!r}"):
+        batch_quote.quote_columns(pricing_file.get(), ["40"] * 3, ["1", "2", room], ["area_check"] * 3)
+
+
+def test_quote_rejects_unknown_room_counts():
+    with pytest.raises(ValueError):
+        pricing_file.get().quote(40, "5", ["area_check"])
+
+
+@pytest.mark.parametrize("area", ["1_000", "²", "-5", "54.5", "", "10000000", str(10**20)])
+def test_malformed_and_oversized_areas_are_rejected_with_their_line(path, area):
+    with pytest.raises(ValueError, match=f"line 3: area must be a whole number up to {batch_quote.MAX_AREA}"):
+        batch_quote.quote_columns(pricing_file.get(), ["40", area], ["1", "1"], ["area_check"] * 2)
+
+
+def test_an_oversized_area_in_an_upload_is_a_readable_error():
+    upload = f"area,rooms,services\n40,1,area_check\n{10**20},2,area_check\n".encode()
+    with pytest.raises(ValueError, match="line 3"):
+        batch_quote.quote_file(pricing_file.get(), upload)
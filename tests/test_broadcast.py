@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import CopyMessage
+
+from broadcast import parse_segment
+from conftest import message_update
+
+MANAGER_ID = 1
+
+
+def test_parse_segment():
+    assert parse_segment("/broadcast") == {}
+    assert parse_segment("/broadcast from=2024-01-01; to=2024-02-01; style=лофт; city=Челн") == {
+        "start": datetime.date(2024, 1, 1),
+        "end": datetime.date(2024, 2, 1),
+        "style": "лофт",
+        "city": "Челн",
+    }
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "/broadcast styl=лофт",
+        "/broadcast style лофт",
+        "/broadcast style=",
+        "/broadcast from=01.02.2024",
+        "/broadcast city=Челн; city=Казань",
+    ],
+)
+def test_parse_segment_rejects_what_it_does_not_understand(text):
+    with pytest.raises(ValueError):
+        parse_segment(text)
+
+
+def test_broadcast_starts_only_after_confirmation(api, order_dispatcher):
+    import T_bot
+
+    for client_id in (40_001, 40_002):
+        T_bot.order_store.add(f"broadcast-test-{client_id}", {"client_id": client_id, "interior_style": "бохо"})
+    bot = Bot("100001:TEST", session=api)
+
+    async def manager(text: str) -> str:
+        await order_dispatcher.feed_update(bot, message_update(MANAGER_ID, text))
+        return api.texts(MANAGER_ID)[-1]
+
+    async def main() -> None:
+        assert "непонятное условие «styl=бохо»" in await manager("/broadcast styl=бохо")
+        assert await manager("Акция!") != "Сообщение выше получат клиентов: 2. Отправить?"
+        assert (await manager("/broadcast style=бохо")).startswith("Получателей: 2.")
+        assert await manager("Акция!") == "Сообщение выше получат клиентов: 2. Отправить?"
+        assert await manager("❌ отмена") == "Рассылка отменена."
+        await manager("/broadcast style=бохо")
+        await manager("Акция!")
+        assert (await manager("✅ отправить")).startswith("Рассылка запущена, получателей: 2")
+        await asyncio.gather(*T_bot.broadcaster._tasks.values())
+
+    asyncio.run(main())
+    copies = [call for call in api.calls if isinstance(call, CopyMessage)]
+    assert sorted(int(call.chat_id) for call in copies) == [40_001, 40_002]
+
+
+def test_resume_after_a_crash_does_not_resend_delivered_messages(api, tmp_path):
+    from broadcast import BroadcastLog, Broadcaster
+    from outbound import OutboundQueue
+
+    log = BroadcastLog(str(tmp_path / "broadcasts.sqlite3"))
+    recipients = list(range(41_001, 41_021))
+    broadcast_id = log.create(MANAGER_ID, 10, 11, recipients)
+    bot = Bot("100001:TEST", session=api)
+
+    def copies():
+        return [call.chat_id for call in api.calls if isinstance(call, CopyMessage)]
+
+    async def main() -> None:
+        crashed = Broadcaster(log, OutboundQueue(global_rate=1000, chat_rate=1000), concurrency=1)
+        crashed.start(bot, broadcast_id)
+        task = crashed._tasks[broadcast_id]
+        while len(copies()) < 5:
+            await asyncio.sleep(0)
+        # The process dies between two sends, long before a batch of 100.
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        restarted = Broadcaster(log, OutboundQueue(global_rate=1000, chat_rate=1000), concurrency=1)
+        await restarted.resume(bot)
+        await restarted._tasks[broadcast_id]
+
+    asyncio.run(main())
+    assert sorted(set(copies())) == recipients
+    # Only the send in flight at the crash may go out twice, not the whole unflushed batch.
+    assert len(copies()) - len(recipients) <= 1
+    assert log.counts(broadcast_id) == {"sent": len(recipients)}
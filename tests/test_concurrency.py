@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+
+from aiogram import Bot
+
+from conftest import callback_update, message_update
+
+USERS = 100
+
+
+def order_answers(user_id: int):
+    return [
+        "/order",
+        "в новостройке",
+        str(40 + user_id % 50),
+        "лофт",
+        "Да",
+        "в следующем месяце",
+        f"ул. Мира, {user_id}",
+        "в другом городе",
+        "в Telegram",
+        f"8999{user_id:07d}",
+        "✅ да",
+    ]
+
+
+def test_orders_stay_isolated_under_concurrent_users(api, order_dispatcher):
+    import T_bot
+
+    bot = Bot("100001:TEST", session=api)
+    users = range(20_000, 20_000 + USERS)
+
+    async def client(user_id: int) -> None:
+        for text in order_answers(user_id):
+            await order_dispatcher.feed_update(bot, message_update(user_id, text))
+
+    async def main() -> None:
+        await asyncio.gather(*(client(user_id) for user_id in users))
+
+    asyncio.run(main())
+
+    for user_id in users:
+        orders = T_bot.order_store.by_client(user_id)
+        assert len(orders) == 1
+        assert orders[0]["phone_number"] == f"8999{user_id:07d}"
+        assert orders[0]["address"] == f"ул. Мира, {user_id}"
+        assert orders[0]["house_area"] == str(40 + user_id % 50)
+        summary = next(text for text in api.texts(user_id) if text.startswith("Давайте еще раз"))
+        assert f"8999{user_id:07d}" in summary
+        assert api.texts(user_id)[-1].startswith("Спасибо!")
+
+
+def test_calculations_stay_isolated_under_concurrent_users(api, calculate_dispatcher):
+    from pricing import pricing_file
+
+    bot = Bot("100002:TEST", session=api)
+    pricing = pricing_file.get()
+    # Four toggles and "calculate" stay within the per-user callback limit.
+    services = list(pricing.services)[:4]
+    rooms = itertools.cycle(["Студия", "1", "2", "3", "4"])
+    users = {
+        user_id: (30 + user_id % 70, next(rooms), [service for n, service in enumerate(services) if user_id >> n & 1])
+        for user_id in range(30_000, 30_000 + USERS)
+    }
+
+    async def client(user_id: int) -> None:
+        area, room, chosen = users[user_id]
+        for text in ("/calculate", str(area), room):
+            await calculate_dispatcher.feed_update(bot, message_update(user_id, text))
+        picker = api.sent[user_id][-1]
+        for service in chosen:
+            await calculate_dispatcher.feed_update(bot, callback_update(user_id, service, picker))
+        await calculate_dispatcher.feed_update(bot, callback_update(user_id, "calculate", picker))
+
+    async def main() -> None:
+        await asyncio.gather(*(client(user_id) for user_id in users))
+
+    asyncio.run(main())
+
+    for user_id, (area, room, chosen) in users.items():
+        expected = pricing.quote(area, room, chosen)
+        assert api.texts(user_id)[-1] == f"Стоимость приемки квартиры составляет: {expected} руб."
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from aiogram import Bot
+from aiogram.methods import AnswerCallbackQuery, ForwardMessage
+
+from conftest import callback_update, message_update
+from idempotency import Deduplicator
+from storage import SQLiteStorage
+from test_concurrency import order_answers
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        yield None
+        return
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+    yield storage
+    asyncio.run(storage.close())
+
+
+def test_a_key_is_claimed_once_until_released(storage):
+    async def main() -> None:
+        dedup = Deduplicator(storage)
+        assert await dedup.claim("order:1:a")
+        assert not await dedup.claim("order:1:a")
+        assert await dedup.claim("order:1:b")
+        await dedup.release("order:1:a")
+        assert await dedup.claim("order:1:a")
+
+    asyncio.run(main())
+
+
+def test_workers_sharing_sqlite_storage_see_each_others_claims(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+
+    async def main() -> None:
+        first, second, third = Deduplicator(storage), Deduplicator(storage), Deduplicator(storage)
+        assert await first.claim("update:1:5")
+        assert not await second.claim("update:1:5")
+        await first.release("update:1:5")
+        assert await third.claim("update:1:5")
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_redelivered_updates_are_handled_once(api, order_dispatcher, calculate_dispatcher):
+    order_bot = Bot("100001:TEST", session=api)
+    calculate_bot = Bot("100002:TEST", session=api)
+    user_id = 70_001
+
+    async def main() -> None:
+        links = message_update(user_id, "/links")
+        await order_dispatcher.feed_update(order_bot, links)
+        await order_dispatcher.feed_update(order_bot, links)
+        for text in ("/calculate", "54", "2"):
+            await calculate_dispatcher.feed_update(calculate_bot, message_update(user_id, text))
+        toggle = callback_update(user_id, "area_check", api.sent[user_id][-1])
+        await calculate_dispatcher.feed_update(calculate_bot, toggle)
+        await calculate_dispatcher.feed_update(calculate_bot, toggle)
+
+    asyncio.run(main())
+    assert api.texts(user_id).count("По ссылкам ниже вы можете ознакомиться с нашими проектами:") == 1
+    assert sum(isinstance(call, AnswerCallbackQuery) for call in api.calls) == 1
+
+
+def test_a_double_tap_on_confirm_saves_one_order(api, order_dispatcher):
+    import T_bot
+
+    bot = Bot("100001:TEST", session=api)
+    user_id = 70_002
+
+    async def main() -> None:
+        for text in order_answers(user_id)[:-1]:
+            await order_dispatcher.feed_update(bot, message_update(user_id, text))
+        await asyncio.gather(
+            *(order_dispatcher.feed_update(bot, message_update(user_id, "✅ да")) for _ in range(2))
+        )
+
+    asyncio.run(main())
+    assert len(T_bot.order_store.by_client(user_id)) == 1
+    assert api.texts(user_id).count("Спасибо! Ваш заказ обрабатывается. Ожидайте уведомления!") == 1
+
+
+def test_a_failed_save_keeps_the_order_for_a_retry(api, order_dispatcher, monkeypatch):
+    import T_bot
+
+    bot = Bot("100001:TEST", session=api)
+    user_id = 70_003
+    save = T_bot.order_sink.save
+    failures = [OSError("disk full")]
+
+    async def flaky_save(order):
+        if failures:
+            raise failures.pop()
+        return await save(order)
+
+    monkeypatch.setattr(T_bot.order_sink, "save", flaky_save)
+
+    async def main() -> None:
+        for text in order_answers(user_id):
+            await order_dispatcher.feed_update(bot, message_update(user_id, text))
+        assert T_bot.order_store.by_client(user_id) == []
+        await order_dispatcher.feed_update(bot, message_update(user_id, "✅ да"))
+
+    asyncio.run(main())
+    assert len(T_bot.order_store.by_client(user_id)) == 1
+    assert api.texts(user_id)[-1].startswith("Спасибо!")
+    assert not any(isinstance(call, ForwardMessage) and call.from_chat_id == user_id for call in api.calls)
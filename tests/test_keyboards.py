@@ -0,0 +1,12 @@
+import pytest
+
+import keyboards
+from benchmarks import legacy
+
+
+@pytest.mark.parametrize("name", sorted(legacy.KEYBOARDS))
+def test_prebuilt_keyboards_match_the_old_ones(name):
+    keyboard = getattr(keyboards, name)
+    rows = [[button.text for button in row] for row in legacy.KEYBOARDS[name]().keyboard]
+    assert [[button.text for button in row] for row in keyboard.markup.keyboard] == rows
+    assert keyboard.options == {text for row in rows for text in row}
@@ -0,0 +1,80 @@
+import asyncio
+import datetime
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendMediaGroup, SendPhoto, TelegramMethod
+from aiogram.types import Chat, FSInputFile, Message, PhotoSize
+
+from conftest import RecordingSession
+from media_cache import MediaCache
+
+
+def photo_message(file_id: str) -> Message:
+    return Message(
+        message_id=1,
+        date=datetime.datetime.now(),
+        chat=Chat(id=1, type="private"),
+        photo=[PhotoSize(file_id=file_id, file_unique_id=file_id, width=1280, height=960)],
+    )
+
+
+def test_file_ids_are_kept_per_bot_and_can_be_forgotten(tmp_path):
+    image = tmp_path / "loft.jpg"
+    image.write_bytes(b"jpeg")
+    path = str(image)
+    cache = MediaCache(str(tmp_path / "media_cache.json"))
+    cache.remember(100001, path, photo_message("file-of-bot-1"))
+
+    assert cache.photo(100001, path) == "file-of-bot-1"
+    assert isinstance(cache.photo(100002, path), FSInputFile)
+    assert MediaCache(cache.path).photo(100001, path) == "file-of-bot-1"
+
+    cache.forget(100001, [path])
+    assert isinstance(cache.photo(100001, path), FSInputFile)
+    assert isinstance(MediaCache(cache.path).photo(100001, path), FSInputFile)
+
+
+class StaleIdSession(RecordingSession):
+    """Rejects albums that use a cached file_id, like Telegram does for another bot's ids."""
+
+    def __init__(self, failing_photo: str) -> None:
+        super().__init__()
+        self.failing_photo = failing_photo
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        if isinstance(method, SendMediaGroup) and any(isinstance(item.media, str) for item in method.media):
+            self.calls.append(method)
+            raise TelegramBadRequest(method, "Bad Request: wrong file identifier/HTTP URL specified")
+        if isinstance(method, SendPhoto):
+            self.calls.append(method)
+            if method.caption == self.failing_photo:
+                raise TelegramBadRequest(method, "Bad Request: PHOTO_INVALID_DIMENSIONS")
+            return photo_message(f"fresh-{method.caption}")
+        return await super().make_request(bot, method, timeout)
+
+
+def test_a_rejected_album_is_resent_from_disk():
+    import T_bot
+    from assets import asset_pipeline
+
+    session = StaleIdSession(failing_photo="хайтек")
+    bot = Bot("100001:TEST", session=session)
+
+    async def main() -> None:
+        paths = [await asset_pipeline.variant(path) for path, _ in T_bot.STYLE_PHOTOS]
+        for path in paths:
+            T_bot.media_cache.remember(bot.id, path, photo_message("stale"))
+        await T_bot.send_style_gallery(bot, 80_001)
+        return paths
+
+    paths = asyncio.run(main())
+    photos = [call for call in session.calls if isinstance(call, SendPhoto)]
+    assert len(photos) == len(T_bot.STYLE_PHOTOS)
+    assert all(isinstance(call.photo, FSInputFile) for call in photos)
+    for path, (_, caption) in zip(paths, T_bot.STYLE_PHOTOS):
+        if caption == "хайтек":
+            assert isinstance(T_bot.media_cache.photo(bot.id, path), FSInputFile)
+        else:
+            assert T_bot.media_cache.photo(bot.id, path) == f"fresh-{caption}"
@@ -0,0 +1,18 @@
+import itertools
+
+import pytest
+
+import keyboards
+from benchmarks import legacy
+from pricing import pricing_file
+
+
+@pytest.mark.parametrize("rooms", sorted(keyboards.ROOMS_NUMBER.options))
+def test_quote_matches_the_old_calculations(rooms):
+    pricing = pricing_file.get()
+    labels = {service_id: f"{service.label} ✅" for service_id, service in pricing.services.items()}
+    for size in range(len(labels) + 1):
+        for service_ids in itertools.combinations(labels, size):
+            chosen = [labels[service_id] for service_id in service_ids]
+            for area in (0, 1, 37, 120):
+                assert pricing.quote(area, rooms, service_ids) == legacy.calculations(area, rooms, chosen)
@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+import time
+import types
+
+from aiogram import Bot
+from aiogram.methods import CopyMessage, ForwardMessage
+from aiogram.types import Chat, Message, Update, User
+
+import config
+import relay as relay_module
+from conftest import message_update
+from relay import RelayMap
+
+
+def test_a_stray_message_reaches_the_manager_and_the_reply_comes_back(api, order_dispatcher):
+    bot = Bot("100001:TEST", session=api)
+    client_id = 95_001
+
+    async def main() -> None:
+        await order_dispatcher.feed_update(bot, message_update(client_id, "Когда приедет замерщик?"))
+        forwarded = api.sent[config.MANAGER_ID][-1]
+        reply = Message(
+            message_id=forwarded.message_id + 1000,
+            date=datetime.datetime.now(),
+            chat=Chat(id=config.MANAGER_ID, type="private"),
+            from_user=User(id=config.MANAGER_ID, is_bot=False, first_name="Manager"),
+            text="Завтра в 10:00",
+            reply_to_message=forwarded,
+        )
+        await order_dispatcher.feed_update(bot, Update(update_id=reply.message_id, message=reply))
+
+    asyncio.run(main())
+    forwards = [call for call in api.calls if isinstance(call, ForwardMessage)]
+    assert [(call.chat_id, call.from_chat_id) for call in forwards] == [(config.MANAGER_ID, client_id)]
+    copies = [call for call in api.calls if isinstance(call, CopyMessage)]
+    assert [(call.chat_id, call.from_chat_id) for call in copies] == [(client_id, config.MANAGER_ID)]
+    assert api.texts(config.MANAGER_ID)[-1] == "Ответ отправлен клиенту."
+
+
+def test_a_reply_to_an_unknown_message_is_not_sent_anywhere(api, order_dispatcher):
+    bot = Bot("100001:TEST", session=api)
+    unrelated = Message(
+        message_id=10**9, date=datetime.datetime.now(), chat=Chat(id=config.MANAGER_ID, type="private")
+    )
+    reply = Message(
+        message_id=10**9 + 1,
+        date=datetime.datetime.now(),
+        chat=Chat(id=config.MANAGER_ID, type="private"),
+        from_user=User(id=config.MANAGER_ID, is_bot=False, first_name="Manager"),
+        text="Кому это?",
+        reply_to_message=unrelated,
+    )
+    asyncio.run(order_dispatcher.feed_update(bot, Update(update_id=reply.message_id, message=reply)))
+    assert not any(isinstance(call, CopyMessage) for call in api.calls)
+    assert api.texts(config.MANAGER_ID)[-1].startswith("Не удалось определить клиента")
+
+
+def test_expired_entries_are_forgotten_in_memory_and_on_disk(tmp_path, monkeypatch):
+    path = str(tmp_path / "relay.sqlite3")
+    now = [time.time()]
+    monkeypatch.setattr(relay_module, "time", types.SimpleNamespace(time=lambda: now[0]))
+
+    async def main() -> None:
+        relay = RelayMap(path, ttl=60)
+        await relay.remember(1, 10, 95_002)
+        assert await relay.client_for(1, 10) == 95_002
+        assert await relay.client_for(2, 10) is None
+        now[0] += 61
+        assert await relay.client_for(1, 10) is None
+        await relay.close()
+        # A restarted process reads the entry from SQLite and still sees it expired.
+        restarted = RelayMap(path, ttl=60)
+        assert await restarted.client_for(1, 10) is None
+        now[0] -= 61
+        assert await restarted.client_for(1, 10) == 95_002
+        await restarted.close()
+
+    asyncio.run(main())
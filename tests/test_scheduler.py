@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Message
+
+import config
+import scheduler as scheduler_module
+from conftest import message_update
+from scheduler import ReminderMiddleware, Scheduler
+from storage import ExpiringMemoryStorage
+
+
+@pytest.fixture
+def jobs_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def recorder(scheduler: Scheduler, runs: list) -> None:
+    @scheduler.handler("record")
+    async def record(bot, payload):
+        runs.append(payload["n"])
+
+
+def test_rescheduling_a_key_replaces_the_job(jobs_path, api):
+    runs = []
+
+    async def main() -> None:
+        scheduler = Scheduler(jobs_path, horizon=10)
+        recorder(scheduler, runs)
+        scheduler.attach(Bot("100001:TEST", session=api), ExpiringMemoryStorage())
+        await scheduler.schedule("sooner", "record", 0.3, {"n": 1})
+        await scheduler.schedule("sooner", "record", 0.05, {"n": 2})
+        await scheduler.schedule("later", "record", 0.05, {"n": 3})
+        await scheduler.schedule("later", "record", 0.4, {"n": 4})
+        await asyncio.sleep(0.2)
+        # The stale heap entry for "later" at 0.05 must not run the job early.
+        assert runs == [2]
+        await asyncio.sleep(0.4)
+        await scheduler.close()
+
+    asyncio.run(main())
+    assert runs == [2, 4]
+
+
+def test_jobs_past_the_horizon_stay_on_disk_until_their_window(jobs_path, api):
+    runs = []
+
+    async def main() -> None:
+        scheduler = Scheduler(jobs_path, horizon=0.2)
+        recorder(scheduler, runs)
+        scheduler.attach(Bot("100001:TEST", session=api), ExpiringMemoryStorage())
+        await asyncio.sleep(0.05)
+        await scheduler.schedule("far", "record", 0.5, {"n": 1})
+        assert not any(key == "far" for _, key in scheduler._heap)
+        await asyncio.sleep(0.3)
+        assert runs == []
+        await asyncio.sleep(0.4)
+        await scheduler.close()
+
+    asyncio.run(main())
+    assert runs == [1]
+
+
+def test_jobs_survive_a_restart_and_cancelled_ones_never_run(jobs_path, api):
+    runs = []
+
+    async def main() -> None:
+        first = Scheduler(jobs_path)
+        await first.schedule("kept", "record", 0.1, {"n": 1})
+        await first.schedule("cancelled", "record", 0.1, {"n": 2})
+        await first.cancel("cancelled")
+        await first.close()
+        second = Scheduler(jobs_path)
+        recorder(second, runs)
+        second.attach(Bot("100001:TEST", session=api), ExpiringMemoryStorage())
+        await asyncio.sleep(0.4)
+        await second.close()
+
+    asyncio.run(main())
+    assert runs == [1]
+
+
+class Flow(StatesGroup):
+    first = State()
+    second = State()
+
+
+def flow_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.message(Command("go"))
+    async def go(message: Message, state: FSMContext) -> None:
+        await state.set_state(Flow.first)
+
+    @router.message(Flow.first)
+    async def answer(message: Message, state: FSMContext) -> None:
+        await state.set_state(Flow.second)
+
+    @router.message(Flow.second)
+    async def finish(message: Message, state: FSMContext) -> None:
+        await state.clear()
+        await message.answer("Готово")
+
+    dp = Dispatcher(storage=ExpiringMemoryStorage())
+    dp.include_router(router)
+    dp.update.outer_middleware(ReminderMiddleware({Flow: "Вы не закончили"}))
+    return dp
+
+
+def test_reminders_follow_the_flow_and_are_cancelled_when_it_ends(jobs_path, api, monkeypatch):
+    scheduler = Scheduler(jobs_path)
+    monkeypatch.setattr(scheduler_module, "scheduler", scheduler)
+    monkeypatch.setattr(config, "REMINDER_DELAY", 3600)
+    user_id = 90_001
+    key = f"reminder:100001:{user_id}:{user_id}"
+
+    def reminder():
+        return scheduler._connect().execute("SELECT payload FROM jobs WHERE key = ?", (key,)).fetchone()
+
+    async def main() -> None:
+        dp = flow_dispatcher()
+        bot = Bot("100001:TEST", session=api)
+        await dp.feed_update(bot, message_update(user_id, "/go"))
+        assert '"state": "Flow:first"' in reminder()[0]
+        await dp.feed_update(bot, message_update(user_id, "ответ"))
+        assert '"state": "Flow:second"' in reminder()[0]
+        await dp.feed_update(bot, message_update(user_id, "ещё ответ"))
+        assert reminder() is None
+        await scheduler.close()
+
+    asyncio.run(main())
+
+
+def test_a_reminder_is_sent_only_if_the_client_is_still_stuck(jobs_path, api, monkeypatch):
+    scheduler = Scheduler(jobs_path)
+    monkeypatch.setattr(scheduler_module, "scheduler", scheduler)
+    scheduler.handlers["reminder"] = scheduler_module.send_reminder
+    monkeypatch.setattr(config, "REMINDER_DELAY", 0.1)
+    stuck, moved_on = 90_002, 90_003
+
+    async def main() -> None:
+        dp = flow_dispatcher()
+        bot = Bot("100001:TEST", session=api)
+        scheduler.attach(bot, dp.storage)
+        for user_id in (stuck, moved_on):
+            await dp.feed_update(bot, message_update(user_id, "/go"))
+        # The state changes without the middleware seeing it, so only the
+        # job's own state check keeps this reminder from going out.
+        await dp.storage.set_state(
+            StorageKey(bot_id=bot.id, chat_id=moved_on, user_id=moved_on), None
+        )
+        await asyncio.sleep(0.4)
+        await scheduler.close()
+
+    asyncio.run(main())
+    assert api.texts(stuck) == ["Вы не закончили"]
+    assert api.texts(moved_on) == []
@@ -0,0 +1,29 @@
+import asyncio
+
+from aiogram import Bot
+
+from conftest import callback_update, message_update
+
+
+def test_rapid_toggles_are_all_kept(api, calculate_dispatcher):
+    from message_edits import message_locks
+    from pricing import pricing_file
+
+    bot = Bot("100002:TEST", session=api)
+    user_id = 50_001
+    chosen = ["area_check", "bank_evaluation", "apartment_plan"]
+
+    async def main() -> None:
+        for text in ("/calculate", "54", "2"):
+            await calculate_dispatcher.feed_update(bot, message_update(user_id, text))
+        picker = api.sent[user_id][-1]
+        # Polling runs updates as concurrent tasks; taps must not overwrite each other.
+        await asyncio.gather(
+            *(calculate_dispatcher.feed_update(bot, callback_update(user_id, service, picker)) for service in chosen)
+        )
+        await calculate_dispatcher.feed_update(bot, callback_update(user_id, "calculate", picker))
+
+    asyncio.run(main())
+    assert not message_locks._locks
+    expected = pricing_file.get().quote(54, "2", chosen)
+    assert api.texts(user_id)[-1] == f"Стоимость приемки квартиры составляет: {expected} руб."
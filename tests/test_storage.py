@@ -0,0 +1,76 @@
+import asyncio
+import time
+import types
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+import storage
+from storage import ExpiringMemoryStorage, create_storage
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(storage, "time", types.SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    return now
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_memory_storage_expires_and_purges_idle_conversations(clock):
+    fsm = create_storage("memory", ttl=60)
+    assert isinstance(fsm, ExpiringMemoryStorage)
+
+    async def main() -> None:
+        for user_id in range(5):
+            await fsm.set_state(key(user_id), "Calculate:rooms_number")
+            await fsm.set_data(key(user_id), {"house_area": "54"})
+        clock[0] += 30
+        await fsm.set_data(key(0), {"house_area": "60"})
+        clock[0] += 31
+        # Reads of expired conversations neither see nor recreate them.
+        assert await fsm.get_state(key(1)) is None
+        assert await fsm.get_data(key(1)) == {}
+        assert await fsm.get_value(key(1), "house_area", "-") == "-"
+        assert await fsm.get_state(key(99)) is None
+        assert key(1) not in fsm.storage and key(99) not in fsm.storage
+
+        assert await fsm.purge_expired(limit=2) == 2
+        assert await fsm.purge_expired() == 1
+        assert await fsm.purge_expired() == 0
+        assert list(fsm.storage) == [key(0)]
+        assert await fsm.get_data(key(0)) == {"house_area": "60"}
+
+        # A conversation set back to nothing holds no memory.
+        await fsm.set_state(key(0), None)
+        await fsm.set_data(key(0), {})
+        assert not fsm.storage and not fsm._updated
+
+    asyncio.run(main())
+
+
+def test_expired_data_does_not_leak_into_a_new_conversation(clock):
+    fsm = ExpiringMemoryStorage(ttl=60)
+
+    async def main() -> None:
+        await fsm.set_data(key(1), {"services": ["area_check"]})
+        clock[0] += 61
+        await fsm.set_state(key(1), "Calculate:house_area")
+        assert await fsm.get_data(key(1)) == {}
+
+    asyncio.run(main())
+
+
+def test_memory_storage_without_ttl_keeps_conversations(clock):
+    fsm = ExpiringMemoryStorage(ttl=None)
+
+    async def main() -> None:
+        await fsm.set_state(key(1), "Calculate:house_area")
+        clock[0] += 10**9
+        assert await fsm.purge_expired() == 0
+        assert await fsm.get_state(key(1)) == "Calculate:house_area"
+
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import AnswerCallbackQuery, SendMediaGroup
+
+from conftest import callback_update, message_update
+from outbound import OutboundQueue
+from throttling import WARNING_TEXT, ActionLimiter, Limit, ThrottlingMiddleware, throttle_key
+
+HOURLY = Limit(rate=3 / 3600, burst=3, action="warn")
+
+
+@pytest.fixture
+def t0() -> float:
+    # Buckets start out at the real monotonic time, so the fake clock starts there too.
+    return time.monotonic()
+
+
+def test_idle_buckets_are_dropped(t0):
+    limit = Limit(rate=1, burst=2)
+    middleware = ThrottlingMiddleware({"callback": limit})
+    middleware._bucket(1, "callback", limit, t0).reserve(t0)
+    middleware._bucket(2, "callback", limit, t0 + 1.5).reserve(t0 + 1.5)
+    assert list(middleware._buckets["callback"]) == [2]
+
+
+def test_live_buckets_are_capped_least_recently_used_first(t0):
+    middleware = ThrottlingMiddleware({"command:order": HOURLY}, max_buckets=3)
+    for now, user_id in enumerate([1, 2, 3, 1, 4]):
+        middleware._bucket(user_id, "command:order", HOURLY, t0 + now).reserve(t0 + now)
+    assert list(middleware._buckets["command:order"]) == [3, 1, 4]
+
+
+def test_a_flood_of_new_users_keeps_the_bucket_count_bounded(t0):
+    middleware = ThrottlingMiddleware({"command:order": HOURLY}, max_buckets=1000)
+    for user_id in range(100_000):
+        middleware._bucket(user_id, "command:order", HOURLY, t0).reserve(t0)
+    assert len(middleware._buckets["command:order"]) == 1000
+
+
+def test_outbound_keeps_buckets_with_queued_sends(t0):
+    queue = OutboundQueue(global_rate=1000, chat_rate=1, chat_burst=1)
+    for _ in range(5):
+        queue._chat_bucket(1, t0).reserve(t0)
+    queue._chat_bucket(2, t0 + 2.0).reserve(t0 + 2.0)
+    # Chat 1 has sends booked until t=4, so its bucket must survive.
+    assert list(queue._chat_buckets) == [1, 2]
+    queue._chat_bucket(3, t0 + 10.0).reserve(t0 + 10.0)
+    assert list(queue._chat_buckets) == [3]
+
+
+def test_action_limiter_only_counts_allowed_steps():
+    limiter = ActionLimiter("gallery", HOURLY)
+    assert [limiter.allow(7) for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow(8)
+
+
+def test_wrong_answers_do_not_block_the_order(api, order_dispatcher):
+    import T_bot
+
+    bot = Bot("100001:TEST", session=api)
+    user_id = 60_001
+
+    async def main() -> None:
+        for text in ["/order", "в новостройке", *["шестьдесят"] * 6, "60"]:
+            await order_dispatcher.feed_update(bot, message_update(user_id, text))
+        for text in ["лофт", "cancel"]:
+            await order_dispatcher.feed_update(bot, message_update(user_id, text))
+
+    asyncio.run(main())
+    texts = api.texts(user_id)
+    assert WARNING_TEXT not in texts
+    assert T_bot.order_questionnaire._routes[T_bot.Order.interior_style.state][0].prompt in texts
+    assert sum(isinstance(call, SendMediaGroup) for call in api.calls) == 1
+    assert texts[-1] == "Отменено"
+
+
+def test_cancel_is_never_throttled():
+    assert throttle_key(message_update(1, "cancel"), "Order:house_area") == "command:cancel"
+    assert throttle_key(message_update(1, "/cancel"), "Order:house_area") == "command:cancel"
+
+
+def test_every_throttled_callback_is_answered(api, calculate_dispatcher):
+    bot = Bot("100002:TEST", session=api)
+    user_id = 60_002
+
+    async def main() -> None:
+        for text in ("/calculate", "54", "2"):
+            await calculate_dispatcher.feed_update(bot, message_update(user_id, text))
+        picker = api.sent[user_id][-1]
+        for _ in range(12):
+            await calculate_dispatcher.feed_update(bot, callback_update(user_id, "area_check", picker))
+
+    asyncio.run(main())
+    answers = [call for call in api.calls if isinstance(call, AnswerCallbackQuery)]
+    assert len({call.callback_query_id for call in answers}) == len(answers) == 12
+    assert [call.text for call in answers].count(WARNING_TEXT) == 1
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import signal
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import config
+import webhook
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Manager"},
+        "text": "/broadcast",
+    },
+}
+
+
+def test_webhook_mode_requires_a_secret(api, monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", None)
+    with pytest.raises(ValueError):
+        webhook.add_bot(web.Application(), Dispatcher(), Bot("100001:TEST", session=api), "t_bot")
+
+
+def test_updates_without_the_secret_are_rejected(api, monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(config, "WEBHOOK_BASE_URL", "")
+    dp = Dispatcher()
+    handled = []
+    dp.message.register(lambda message: handled.append(message.text))
+    app = web.Application()
+    webhook.add_bot(app, dp, Bot("100001:TEST", session=api), "t_bot")
+
+    async def main() -> None:
+        async with TestClient(TestServer(app)) as client:
+            forged = await client.post("/webhook/t_bot", json=UPDATE)
+            assert forged.status == 401
+            wrong = await client.post(
+                "/webhook/t_bot", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "guess"}
+            )
+            assert wrong.status == 401
+            genuine = await client.post(
+                "/webhook/t_bot", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+            )
+            assert genuine.status == 200
+            # The update is handled in the background after the response.
+            for _ in range(100):
+                if handled:
+                    break
+                await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert handled == ["/broadcast"]
+
+
+def test_sigterm_stops_the_webhook_server_gracefully(api, monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(config, "WEBHOOK_BASE_URL", "")
+    monkeypatch.setattr(config, "WEBHOOK_HOST", "127.0.0.1")
+    monkeypatch.setattr(config, "WEBHOOK_PORT", 0)
+    dp = Dispatcher()
+    events = []
+    dp.startup.register(lambda: events.append("startup"))
+    dp.shutdown.register(lambda: events.append("shutdown"))
+
+    async def main() -> None:
+        server = asyncio.create_task(webhook.serve([(dp, Bot("100001:TEST", session=api), "t_bot")]))
+        while not events:
+            await asyncio.sleep(0.01)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(server, 5)
+
+    asyncio.run(main())
+    assert events == ["startup", "shutdown"]
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+import config
+import metrics
+from outbound import TokenBucket
+
+WARNING_TEXT = "Слишком много запросов, подождите немного."
+
+
+@dataclass(frozen=True)
+class Limit:
+    """``rate`` requests per second with bursts of ``burst``.
+
+    ``action`` says what happens to a request over the limit: "drop" ignores
+    it, "delay" holds it until a token is free (dropping it if that takes
+    longer than ``max_delay`` seconds) and "warn" tells the user once and then
+    ignores further requests until the bucket refills. Ignored callback
+    queries are still answered, silently.
+    """
+
+    rate: float
+    burst: int
+    action: str = "drop"
+    max_delay: float = 5.0
+
+
+def throttle_key(event: Update, raw_state: Optional[str]) -> str:
+    """Names the kind of request: the command, the questionnaire step or a callback."""
+    if event.callback_query is not None:
+        return "callback"
+    message = event.message
+    if message is not None and message.text and message.text.startswith("/") and len(message.text) > 1:
+        return "command:" + message.text[1:].split(maxsplit=1)[0].partition("@")[0].lower()
+    if message is not None and message.text == "cancel":
+        return "command:cancel"
+    if raw_state:
+        return "state:" + raw_state
+    return "message"
+
+
+class _UserBucket(TokenBucket):
+    __slots__ = ("warned",)
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        super().__init__(rate, capacity)
+        self.warned = False
+
+
+def _lru_bucket(
+    buckets: "OrderedDict[int, _UserBucket]", user_id: int, limit: Limit, now: float, max_buckets: int
+) -> _UserBucket:
+    bucket = buckets.get(user_id)
+    if bucket is not None:
+        buckets.move_to_end(user_id)
+        return bucket
+    # Idle buckets hold no state; past the cap the oldest goes regardless.
+    while buckets and (len(buckets) >= max_buckets or next(iter(buckets.values())).idle(now)):
+        buckets.popitem(last=False)
+    bucket = buckets[user_id] = _UserBucket(limit.rate, limit.burst)
+    return bucket
+
+
+class ActionLimiter:
+    """Per-user limit on an expensive step a handler takes once it has accepted a request.
+
+    The middleware counts every update of a kind; this only counts the step
+    itself, so answers that fail validation never use up the allowance.
+    """
+
+    def __init__(self, name: str, limit: Limit, max_buckets: int = 10000) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[int, _UserBucket]" = OrderedDict()
+
+    def allow(self, user_id: int) -> bool:
+        """Takes a token; False means the step should be skipped this time."""
+        if user_id == config.MANAGER_ID:
+            return True
+        now = time.monotonic()
+        bucket = _lru_bucket(self._buckets, user_id, self.limit, now, self.max_buckets)
+        if bucket.reserve(now):
+            bucket.tokens += 1
+            metrics.THROTTLED.inc(self.name, "skip")
+            return False
+        return True
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Per-user token buckets for each limited kind of request.
+
+    Kinds listed in ``limits`` get their own bucket per user; everything else
+    shares one bucket per user with the ``default`` limit. Each kind keeps its
+    buckets in least recently used order, so idle ones are dropped from the
+    head whenever a bucket is added. Past ``max_buckets`` per kind the least
+    recently used bucket goes too, which at worst gives that user a fresh burst.
+    """
+
+    def __init__(
+        self,
+        limits: Mapping[str, Limit],
+        default: Optional[Limit] = None,
+        max_buckets: int = 10000,
+    ) -> None:
+        self.limits = dict(limits)
+        self.default = default
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, "OrderedDict[int, _UserBucket]"] = {}
+
+    def _bucket(self, user_id: int, key: str, limit: Limit, now: float) -> _UserBucket:
+        return _lru_bucket(self._buckets.setdefault(key, OrderedDict()), user_id, limit, now, self.max_buckets)
+
+    async def _reject(self, event: Update, warn: bool) -> None:
+        try:
+            if event.callback_query is not None:
+                # Unanswered, the query leaves a spinner on the client's button.
+                await event.callback_query.answer(WARNING_TEXT if warn else None)
+            elif warn and event.message is not None:
+                await event.message.answer(WARNING_TEXT)
+        except Exception:
+            logging.exception("Answering a throttled update failed")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or user.id == config.MANAGER_ID:
+            return await handler(event, data)
+        key = throttle_key(event, data.get("raw_state"))
+        if key == "command:cancel":
+            # Getting out of a flow must always work.
+            return await handler(event, data)
+        limit = self.limits.get(key)
+        if limit is None:
+            if self.default is None:
+                return await handler(event, data)
+            key, limit = "*", self.default
+        bucket = self._bucket(user.id, key, limit, time.monotonic())
+        delay = bucket.reserve(time.monotonic())
+        if delay:
+            if limit.action == "delay" and delay <= limit.max_delay:
+                await asyncio.sleep(delay)
+            else:
+                # Hand the token back: a rejected request must not push the
+                # next allowed one further away.
+                bucket.tokens += 1
+                metrics.THROTTLED.inc(key, limit.action)
+                warn = limit.action == "warn" and not bucket.warned
+                if warn:
+                    bucket.warned = True
+                await self._reject(event, warn)
+                return None
+        bucket.warned = False
+        return await handler(event, data)
+
+
+def setup(dp: Dispatcher, limits: Mapping[str, Limit]) -> ThrottlingMiddleware:
+    """Throttles ``limits`` and, when THROTTLE_RATE is set, everything else per user."""
+    default = None
+    if config.THROTTLE_RATE:
+        default = Limit(config.THROTTLE_RATE, config.THROTTLE_BURST, "delay")
+    middleware = ThrottlingMiddleware(limits, default)
+    dp.update.outer_middleware(middleware)
+    return middleware
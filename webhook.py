@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import signal
+from contextlib import suppress
+from typing import Sequence, Tuple
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+import config
+
+
+def add_bot(app: web.Application, dp: Dispatcher, bot: Bot, name: str) -> None:
+    # Without the secret anyone who can reach the port could post updates
+    # on behalf of any user, the manager included.
+    if not config.WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_SECRET must be set in webhook mode")
+    path = f"/webhook/{name}"
+
+    async def set_webhook() -> None:
+        await bot.set_webhook(
+            url=config.WEBHOOK_BASE_URL.rstrip("/") + path,
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    if config.WEBHOOK_BASE_URL:
+        dp.startup.register(set_webhook)
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=config.WEBHOOK_SECRET
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+
+
+async def serve(bots: Sequence[Tuple[Dispatcher, Bot, str]]) -> None:
+    """Serves until SIGINT or SIGTERM, then runs every dispatcher's shutdown hooks."""
+    app = web.Application()
+    for dp, bot, name in bots:
+        add_bot(app, dp, bot, name)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(signum, stop.set)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+    await site.start()
+    logging.info(
+        "Serving webhooks for %s on %s:%d",
+        ", ".join(name for _, _, name in bots),
+        config.WEBHOOK_HOST,
+        config.WEBHOOK_PORT,
+    )
+    try:
+        await stop.wait()
+        logging.info("Stopping webhooks")
+    finally:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(signum)
+        await runner.cleanup()